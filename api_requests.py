@@ -1,7 +1,29 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import requests
 
+from chapter_cache import chapter_cache
+from compact_chapter import CompactChapter
+from http_client import HttpClient
+from instrumentation import cache_lookup, propagate
+from scripture_store import store
+from single_flight import SingleFlight
+from strongs import clean_chapter
+
 MOST_READ = ["NIV", "KJV", "NKJV", "ESV", "NLT", "NASB", "MSG"]
-BASE_URL = "https://bolls.life"
+BASE_URL = os.environ.get("BOLLS_BASE_URL", "https://bolls.life")
+
+client = HttpClient(BASE_URL)
+single_flight = SingleFlight()
+
+# Upper bound on concurrent chapter fetches per process
+FETCH_WORKERS = int(os.environ.get("UPSTREAM_FETCH_WORKERS", 8))
+
+_fetch_pool = None
+_fetch_pool_pid = None
+_fetch_pool_lock = threading.Lock()
 
 
 def get_translations():
@@ -10,7 +32,7 @@ def get_translations():
     ["abbrevation - full name"]
     """
     try:
-        response = requests.get(f"{BASE_URL}/static/bolls/app/views/languages.json")
+        response = client.get("/static/bolls/app/views/languages.json")
         response.raise_for_status()  # Raise an exception for bad responses (4xx or 5xx)
         english_translations = [
             entry for entry in response.json() if entry["language"] == "English"
@@ -36,13 +58,174 @@ def get_books():
     Return a list of 66 bible books:
     {"bookid", "name", "chronorder", "chapters"}
     """
-    books = requests.get(
-        f"{BASE_URL}/static/bolls/app/views/translations_books.json"
-    ).json()["YLT"]
+    books = client.get_json("/static/bolls/app/views/translations_books.json")["YLT"]
 
     return books
 
 
+def fetch_chapter(translation, book, chapter):
+    """
+    Fetches a whole chapter from bolls.life:
+    [{"pk", "verse", "text"}]
+    Raises a RequestException when upstream can't be reached.
+    """
+    response = client.get(f"/get-chapter/{translation}/{book}/{chapter}")
+
+    if response.status_code != 200:
+        # Handle non-200 status code cases
+        print(f"Error fetching scripture: {response.status_code} - {response.text}")
+        return None
+
+    return response.json()
+
+
+def get_chapter(translation, book, chapter):
+    """
+    Returns a whole chapter from the chapter cache, the local store when the
+    translation has been ingested, or bolls.life otherwise
+    """
+    key = (translation, int(book), int(chapter))
+    verses = chapter_cache.get(key)
+    cache_lookup(verses is not None)
+
+    if verses is not None:
+        return verses
+
+    verses = store.get_chapter(translation, book, chapter)
+
+    if verses is not None:
+        # The store is already on local disk, keep it out of the shared cache
+        return chapter_cache.set(key, verses, shared=False)
+
+    try:
+        return refresh_chapter(*key)
+    except requests.exceptions.RequestException as e:
+        # Upstream is failing or the breaker is open, serve an expired copy
+        print(f"Error fetching scripture: {e}")
+        verses = chapter_cache.disk.get(key, allow_stale=True)
+        return CompactChapter.from_verses(verses) if verses is not None else None
+
+
+def refresh_chapter(translation, book, chapter):
+    """
+    Fetches a chapter from bolls.life into the chapter cache and returns it,
+    None if upstream has no such chapter.
+    Raises a RequestException when upstream can't be reached.
+    """
+    key = (translation, int(book), int(chapter))
+    return single_flight.do(key, lambda: _load_remote_chapter(key))
+
+
+def _load_remote_chapter(key):
+    """
+    Fetches a chapter from bolls.life unless another worker process fetched
+    it into the shared cache while this one waited for the lock
+    """
+    with single_flight.process_lock(key) as waited:
+        if waited:
+            verses = chapter_cache.disk.get(key)
+
+            if verses is not None:
+                return chapter_cache.set(key, verses, shared=False)
+
+        verses = fetch_chapter(*key)
+
+        if not verses:
+            return None
+
+        # parse once here so cached chapters render without tag stripping
+        return chapter_cache.set(key, clean_chapter(verses, key[1]))
+
+
+def fetch_pool():
+    """Worker pool for chapter fetches, created lazily in each process"""
+    global _fetch_pool, _fetch_pool_pid
+
+    if _fetch_pool is None or _fetch_pool_pid != os.getpid():
+        with _fetch_pool_lock:
+            if _fetch_pool is None or _fetch_pool_pid != os.getpid():
+                _fetch_pool = ThreadPoolExecutor(
+                    max_workers=FETCH_WORKERS, thread_name_prefix="chapter-fetch"
+                )
+                _fetch_pool_pid = os.getpid()
+
+    return _fetch_pool
+
+
+def _get_chapter_or_none(key):
+    try:
+        return get_chapter(*key)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+
+def submit_chapters(keys):
+    """
+    Starts loading the given chapters on the fetch pool without waiting:
+    {(translation, book, chapter): Future of verses or None}
+    Each distinct chapter is loaded once and chapters already in memory
+    come back as completed futures.
+    """
+    futures = {}
+
+    for translation, book, chapter in keys:
+        key = (translation, int(book), int(chapter))
+        if key in futures:
+            continue
+
+        verses = chapter_cache.memory.get(key)
+        if verses is not None:
+            cache_lookup(True)
+            futures[key] = Future()
+            futures[key].set_result(verses)
+        else:
+            # keeps the pool's time and cache lookups on this request
+            futures[key] = fetch_pool().submit(propagate(_get_chapter_or_none), key)
+
+    return futures
+
+
+def get_chapters(keys):
+    """
+    Returns {(translation, book, chapter): verses or None} for the given keys.
+    Chapters that aren't already in memory are loaded concurrently.
+    """
+    return {key: future.result() for key, future in submit_chapters(keys).items()}
+
+
+def select_verses(chapter, start_verse, end_verse):
+    """
+    Returns the selected verse or verses of a chapter as a VerseRange over
+    the chapter's buffer. Raises IndexError for verses outside the chapter.
+    """
+    return CompactChapter.from_verses(chapter).select(start_verse, end_verse)
+
+
+def iter_translation(translation, books=None):
+    """
+    Yields every verse of a translation, chapter by chapter, from bolls.life:
+    {"book", "chapter", "verse", "text", "pk"}
+    """
+    for book in books or get_books():
+        for chapter in range(1, book["chapters"] + 1):
+            verses = fetch_chapter(translation, book["bookid"], chapter)
+
+            if verses is None:
+                raise RuntimeError(
+                    f"Could not fetch {translation} {book['name']} {chapter}"
+                )
+
+            for verse in verses:
+                yield {
+                    "book": book["bookid"],
+                    "chapter": chapter,
+                    "verse": verse["verse"],
+                    "text": verse["text"],
+                    "pk": verse.get("pk"),
+                }
+
+
 def get_scripture(criteria):
     """
     Returns scripture(s) based on chapter and selected verse or verses
@@ -51,31 +234,38 @@ def get_scripture(criteria):
     try:
         translation, book, chapter, start_verse, end_verse = criteria
 
-        # Send the Get requests to'/get-text/' depending on input
-        request_chapter = f"{BASE_URL}/get-chapter/{translation}/{book}/{chapter}"
-
         # Get the whole chapter
+        chapter = get_chapter(translation, book, chapter)
 
-        response = requests.get(request_chapter)
-        chapter = response.json()
-
-        if response.status_code == 200:
-            if start_verse and end_verse:
-                verses = [chapter[verse] for verse in range(start_verse - 1, end_verse)]
-                return verses
-            elif start_verse:
-                return [chapter[start_verse - 1]]
-            elif end_verse:
-                verses = [chapter[verse] for verse in range(0, end_verse)]
-                return verses
-            else:
-                return chapter
-        else:
-            # Handle non-200 status code cases
-            print(f"Error fetching scripture: {response.status_code} - {response.text}")
+        if chapter is None:
             return None
 
+        return select_verses(chapter, start_verse, end_verse)
+
     except Exception as e:
         # Handle any exceptions raised during the process
         print(f"An error occurred: {e}")
         return None
+
+
+def get_scriptures(criteria_list):
+    """
+    Returns get_scripture results for several criteria, their chapters
+    loaded concurrently on the fetch pool
+    """
+    keys = [(t, int(b), int(c)) for t, b, c, _, _ in criteria_list]
+    chapters = get_chapters(keys)
+    scriptures = []
+
+    for key, (_, _, _, start, end) in zip(keys, criteria_list):
+        try:
+            scriptures.append(
+                select_verses(chapters[key], start, end)
+                if chapters[key] is not None
+                else None
+            )
+        except IndexError as e:
+            print(f"An error occurred: {e}")
+            scriptures.append(None)
+
+    return scriptures
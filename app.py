@@ -1,32 +1,83 @@
 # pip imports
+import csv
 import os
 
-from flask import Flask, g, redirect, render_template, flash, request, session
+import click
+
+from flask import (
+    Flask,
+    g,
+    redirect,
+    render_template,
+    flash,
+    request,
+    session,
+    jsonify,
+    Response,
+    get_flashed_messages,
+    stream_template,
+    stream_with_context,
+)
 from flask_debugtoolbar import DebugToolbarExtension
+from flask_migrate import Migrate
 from psycopg2 import IntegrityError
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from requests.exceptions import RequestException
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # created imports
-from api_requests import get_scripture
-from forms import AddUserForm, EditUserForm, SearchForm, LoginForm
+from api_requests import (
+    iter_translation,
+    get_scripture,
+    get_scriptures,
+    client,
+    single_flight,
+    submit_chapters,
+    MOST_READ,
+)
+import cache_warmer
+from chapter_cache import chapter_cache
+from conditional_get import conditional_page
+from fragment_cache import fragment, fragment_cache
+from identity_cache import identity_cache, StaleIdentity
+import instrumentation
+from password_hasher import password_hasher, PasswordHasherBusy
+from forms import (
+    AddUserForm,
+    EditUserForm,
+    SearchForm,
+    LoginForm,
+    TextSearchForm,
+    ReferenceSearchForm,
+    ImportFavoritesForm,
+)
 from models import db, connect_db, User, Favorite, Tag
+from scripture_store import store, read_dump
+from bible_metadata import metadata
+from search_index import search_engine
+from concordance import concordance
+from reference_parser import parse_references
 
 from services_users import UserService
 from services_favorites import FavoriteService
 from services_tags import TagService
 from services_search import SearchService
+from services_transfer import TransferService, iter_csv, iter_json
 
 # Instantiate the service classes
 user_service = UserService()
 favorite_service = FavoriteService()
 tag_service = TagService()
 search_service = SearchService()
+transfer_service = TransferService()
 
 app = Flask(__name__)
 app.app_context().push()
+# first, so the timings cover every other request hook
+instrumentation.init_app(app)
 # for flask debugtoolbar
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "oh-so-secret")
 app.config["DEBUG_TB_INTERCEPT_REDIRECTS"] = False
@@ -39,12 +90,32 @@ app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
 # app.config["SQLALCHEMY_DATABASE_URI"] = "postgresql:///scripture-sanctuary-test"
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# largest favorites file accepted by the import page
+app.config["MAX_CONTENT_LENGTH"] = int(
+    os.environ.get("IMPORT_MAX_BYTES", 64 * 1024 * 1024)
+)
 app.config["SQLALCHEMY_ECHO"] = False
 
 connect_db(app)
+migrate = Migrate(app, db)
+app.add_template_global(fragment)
 
 CURR_USER_KEY = "curr_user"
 
+# Passages rendered by one reference search
+MAX_PASSAGES = 50
+
+
+def stream_page(template_name, **context):
+    """
+    Renders a template as a stream so the top of the page reaches the
+    client while the rest is still rendering or waiting on upstream
+    """
+    # the session cookie is saved before the body streams, so flashes have
+    # to be taken out of it now; the template reads them from the request
+    get_flashed_messages()
+    return Response(stream_template(template_name, **context))
+
 
 @app.errorhandler(404)
 def page_not_found(e):
@@ -52,6 +123,23 @@ def page_not_found(e):
     return render_template("404.html"), 404
 
 
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    """Too many logins or signups at once, turned away without waiting"""
+    print(f"Password hashing rejected: {e}")
+    return render_template("503.html"), 503, {"Retry-After": "2"}
+
+
+@app.errorhandler(StaleIdentity)
+def stale_identity(e):
+    """The signed in user was deleted in another worker, sign them out"""
+    print(f"Signing out: {e}")
+    session.pop(CURR_USER_KEY, None)
+    g.user = None
+    flash("Your account no longer exists.", "danger")
+    return redirect("/")
+
+
 ##############################################################################
 # User signup/login/logout
 
@@ -61,7 +149,8 @@ def add_user_to_g():
     """If we're logged in, add curr user to Flask global."""
 
     if CURR_USER_KEY in session:
-        g.user = db.session.get(User, session[CURR_USER_KEY])
+        # navbar fields come from the identity cache, the row loads on demand
+        g.user = identity_cache.get(session[CURR_USER_KEY])
 
     else:
         g.user = None
@@ -77,6 +166,7 @@ def do_logout():
     """Logout user."""
 
     if CURR_USER_KEY in session:
+        identity_cache.forget(session[CURR_USER_KEY])
         del session[CURR_USER_KEY]
 
 
@@ -169,9 +259,9 @@ def home_page():
 @app.route("/users", methods=["GET"])
 def show_users():
     """
-    Shows all users
+    Shows users, one page at a time
     """
-    users = db.session.query(User).all()
+    users = user_service.get_users_page(request.args.get("after"))
     return render_template("users/users.html", users=users)
 
 
@@ -181,11 +271,18 @@ def user_profile(user_id):
     Gets User by id
     """
     user = user_service.get_user_by_id(user_id)
-    scriptures = favorite_service.format_favorite_query(user.favorites)
+    favorites = favorite_service.get_user_favorites_page(
+        user_id, request.args.get("after")
+    )
+    scriptures = favorite_service.format_favorite_query(favorites)
     tags = user_service.get_user_tags(user_id)
 
     return render_template(
-        "users/user_profile.html", user=user, scriptures=scriptures, tags=tags
+        "users/user_profile.html",
+        user=user,
+        scriptures=scriptures,
+        tags=tags,
+        next_cursor=favorites.next_cursor,
     )
 
 
@@ -197,7 +294,8 @@ def edit_user(user_id):
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
-    form = EditUserForm(obj=g.user)
+    user = g.user.row
+    form = EditUserForm(obj=user)
 
     if form.validate_on_submit():
         user_data = {
@@ -212,13 +310,13 @@ def edit_user(user_id):
         }
 
         # Update the user with the new data
-        user_service.update_user(g.user, user_data)
+        user_service.update_user(user, user_data)
 
-        flash(f"User {g.user.username}'s details have been updated!", "success")
+        flash(f"User {user.username}'s details have been updated!", "success")
 
         return redirect(f"/users/{user_id}")
 
-    return render_template("users/edit_user.html", form=form, user=g.user)
+    return render_template("users/edit_user.html", form=form, user=user)
 
 
 @app.route("/users/<int:user_id>/delete", methods=["POST"])
@@ -231,13 +329,79 @@ def delete_user(user_id):
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
-    user_service.delete_user(g.user)
+    user_service.delete_user(g.user.row)
 
     flash(f"{g.user.username} has been deleted.", "danger")
 
     return redirect(f"/users")
 
 
+@app.route("/users/<int:user_id>/favorites/export.<any(csv, json):fmt>")
+def export_favorites(user_id, fmt):
+    """
+    Streams the user's favorites and their tags as CSV or JSON
+    """
+
+    if not g.user or g.user.id != user_id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    if fmt == "csv":
+        rows, mimetype = transfer_service.export_csv(user_id), "text/csv"
+    else:
+        rows, mimetype = transfer_service.export_json(user_id), "application/json"
+
+    return Response(
+        stream_with_context(rows),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="favorites.{fmt}"'
+        },
+    )
+
+
+@app.route("/users/<int:user_id>/favorites/import", methods=["GET", "POST"])
+def import_favorites(user_id):
+    """
+    Adds favorites from an uploaded CSV or JSON file, e.g. an export
+    """
+
+    if not g.user or g.user.id != user_id:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    form = ImportFavoritesForm()
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        is_json = upload.filename.lower().endswith((".json", ".jsonl"))
+        rows = iter_json(upload.stream) if is_json else iter_csv(upload.stream)
+
+        try:
+            summary = transfer_service.import_favorites(
+                user_id, rows, form.translation.data
+            )
+        except (ValueError, UnicodeDecodeError, csv.Error, IntegrityError) as e:
+            print(f"Import failed: {e}")
+            flash("Could not read the file, nothing was imported", "danger")
+            return render_template("users/import_favorites.html", form=form, user=g.user)
+
+        flash(
+            f"Imported {summary['imported']} favorites "
+            f"and created {summary['tags_created']} topics",
+            "success",
+        )
+        if summary["skipped"]:
+            flash(
+                f"Skipped {summary['skipped']} rows: {'; '.join(summary['errors'])}",
+                "danger",
+            )
+
+        return redirect(f"/users/{user_id}")
+
+    return render_template("users/import_favorites.html", form=form, user=g.user)
+
+
 ##############################################################################
 # General routes:
 
@@ -255,27 +419,49 @@ def restricted():
 
 @app.route("/favorites/<int:favorite_id>")
 def show_favorite(favorite_id):
-    """Shows favorites using id"""
+    """
+    Shows favorites using id
+    Repeat visits are answered with a 304 before the passage is fetched
+    """
 
-    favorite = Favorite.query.get_or_404(favorite_id)
-    time = favorite.created_at.strftime(f"%a %b %d %Y, %-I:%M %p")
-    formatted_scripture = favorite_service.format_favorite_query([favorite])[0]
+    # the owner is on every version of the page, load it in the same query
+    favorite = Favorite.query.options(joinedload(Favorite.users)).get_or_404(
+        favorite_id
+    )
+    owner = favorite.users
     criteria = favorite_service.get_favorite_criteria(favorite)
-    scripture_text = get_scripture(criteria)
+    tags = favorite.tags
+
+    parts = (
+        "favorite",
+        favorite.id,
+        criteria,
+        favorite.created_at,
+        favorite.updated_at,
+        (owner.id, owner.first_name, owner.last_name),
+        [(tag.id, tag.name) for tag in tags],
+    )
+    last_modified = max([favorite.updated_at] + [tag.updated_at for tag in tags])
 
-    if not scripture_text:
-        flash(f"Sorry, scripture not found.", "danger")
-        return redirect("/search")
+    def render():
+        time = favorite.created_at.strftime(f"%a %b %d %Y, %-I:%M %p")
+        formatted_scripture = favorite_service.format_favorite_query([favorite])[0]
+        scripture_text = get_scripture(criteria)
 
-    formatted_verses = favorite_service.format_verses(scripture_text)
+        if not scripture_text:
+            flash(f"Sorry, scripture not found.", "danger")
+            return redirect("/search")
 
-    return render_template(
-        "favorites/favorite.html",
-        favorite=favorite,
-        time=time,
-        formatted_scripture=formatted_scripture,
-        scripture_text=formatted_verses,
-    )
+        return stream_page(
+            "favorites/favorite.html",
+            favorite=favorite,
+            time=time,
+            formatted_scripture=formatted_scripture,
+            scripture_text=scripture_text,
+            passage=criteria,
+        )
+
+    return conditional_page(parts, last_modified, render)
 
 
 @app.route("/favorites/new", methods=["POST"])
@@ -320,7 +506,7 @@ def edit_favorite(favorite_id):
 
     favorite = favorite_service.get_fav_by_id(favorite_id)
 
-    if not g.user.id or g.user.id != favorite.users.id:
+    if not g.user or g.user.id != favorite.user_id:
         flash("Unauthorized", "danger")
         return redirect("/")
 
@@ -352,20 +538,54 @@ def edit_favorite(favorite_id):
 def show_tags():
     """show tags page"""
 
-    tags = tag_service.get_all_tags()
+    tags = tag_service.get_tags_page(request.args.get("after"))
+    own_tags = tag_service.get_own_tags(g.user.id) if g.user else []
 
-    return render_template("tags/tags.html", tags=tags)
+    return render_template("tags/tags.html", tags=tags, own_tags=own_tags)
 
 
 @app.route("/tags/<int:tag_id>")
 def show_tag_details(tag_id):
-    """show tag detail page"""
+    """
+    show tag detail page
+    Chapters load concurrently while the page streams, each entry is
+    rendered as soon as its own chapter is ready. Repeat visits are
+    answered with a 304 before any chapter is loaded.
+    """
 
     tag = Tag.query.get_or_404(tag_id)
 
-    scriptures = favorite_service.get_scriptures(tag)
+    favorites = favorite_service.get_tag_favorites_page(
+        tag_id, request.args.get("after")
+    )
+
+    parts = (
+        "tag",
+        tag.id,
+        tag.name,
+        tag.user_id,
+        tag.updated_at,
+        [tuple(favorite) for favorite in favorites],
+        favorites.next_cursor,
+    )
+    last_modified = max(
+        [tag.updated_at] + [favorite.updated_at for favorite in favorites]
+    )
+
+    def render():
+        chapters = submit_chapters(favorite_service.get_chapter_keys(favorites))
+        scriptures = favorite_service.iter_tag_scriptures(
+            favorites, lambda key: chapters[key].result()
+        )
+
+        return stream_page(
+            "tags/tag_details.html",
+            tag=tag,
+            scriptures=scriptures,
+            next_cursor=favorites.next_cursor,
+        )
 
-    return render_template("tags/tag_details.html", tag=tag, scriptures=scriptures)
+    return conditional_page(parts, last_modified, render)
 
 
 @app.route("/tags/new", methods=["GET", "POST"])
@@ -463,15 +683,15 @@ def search():
                 flash(f"Sorry, scripture not found.", "danger")
                 return redirect("/search")
 
-            verses = favorite_service.format_verses(scripture_text)
             scripture = search_service.format_scripture(criteria)
             formatted_scripture = favorite_service.format_scripture(scripture)
 
-            return render_template(
+            return stream_page(
                 "search.html",
                 form=form,
-                scripture_text=verses,
+                scripture_text=scripture_text,
                 formatted_scripture=formatted_scripture,
+                passage=criteria,
             )
         else:
             # Form is not valid
@@ -481,3 +701,191 @@ def search():
 
     else:
         return render_template("search.html", form=form)
+
+
+@app.route("/search/text", methods=["GET"])
+def text_search():
+    """
+    Full-text search over the verses of ingested translations
+    Supports "phrases", OR, NOT and -word
+    """
+
+    form = TextSearchForm(request.args)
+    results = None
+
+    if request.args and form.validate():
+        book = int(form.book.data) if form.book.data else None
+        page = request.args.get("page", 1, type=int)
+
+        results = search_engine.search(form.q.data, form.translation.data, book, page)
+        search_service.format_text_results(results["results"])
+
+    return render_template("text_search.html", form=form, results=results)
+
+
+@app.route("/search/reference", methods=["GET"])
+def reference_search():
+    """
+    Looks up passages typed as references, e.g. "Jn 3:16-18; Rom 8; 1 Cor 13:4-7"
+    """
+
+    form = ReferenceSearchForm(request.args)
+    passages = None
+
+    if request.args and form.validate():
+        criteria, unmatched = parse_references(form.q.data, form.translation.data)
+
+        if unmatched:
+            flash(f"Not recognized: {'; '.join(unmatched)}", "danger")
+        if len(criteria) > MAX_PASSAGES:
+            flash(f"Showing the first {MAX_PASSAGES} passages", "danger")
+            criteria = criteria[:MAX_PASSAGES]
+
+        texts = get_scriptures(criteria)
+        passages = [
+            {
+                "title": favorite_service.format_scripture(
+                    search_service.format_scripture(crit)
+                ),
+                "verses": text or None,
+                "passage": crit,
+            }
+            for crit, text in zip(criteria, texts)
+        ]
+
+    return render_template("reference_search.html", form=form, passages=passages)
+
+
+@app.route("/concordance/<number>")
+def concordance_lookup(number):
+    """
+    Verses tagged with a Strong's number, e.g. /concordance/G26?translation=KJV
+    Only translations ingested with Strong's tags have entries
+    """
+
+    translation = request.args.get("translation", "KJV")
+    limit = min(request.args.get("limit", 100, type=int), 500)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+
+    results = concordance.lookup(number, translation, limit, offset)
+
+    if results is None:
+        return jsonify(error="Not a Strong's number, expected e.g. G26 or H430"), 400
+
+    search_service.format_text_results(results["results"])
+    return jsonify(results)
+
+
+##############################################################################
+# Status routes:
+
+
+@app.route("/status/upstream")
+def upstream_status():
+    """Breaker state, pool statistics, cache and coalescing counters"""
+
+    return jsonify(
+        http=client.stats(),
+        chapter_cache=chapter_cache.stats(),
+        fragment_cache=fragment_cache.stats(),
+        identity_cache=identity_cache.stats(),
+        password_hasher=password_hasher.stats(),
+        single_flight=single_flight.stats(),
+    )
+
+
+@app.route("/metrics")
+def metrics():
+    """Request timings of this process in the Prometheus text format"""
+
+    return Response(
+        instrumentation.render_metrics(),
+        mimetype="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+##############################################################################
+# CLI commands:
+
+
+@app.cli.command("ingest-translations")
+@click.argument("translations", nargs=-1)
+@click.option(
+    "--file",
+    "path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Load a downloaded bolls.life JSON dump instead of the API.",
+)
+def ingest_translations(translations, path):
+    """
+    Loads whole translations into the local scripture store
+    (defaults to the most read translations)
+    """
+
+    for translation in translations or MOST_READ:
+        verses = read_dump(path, translation) if path else iter_translation(translation)
+
+        try:
+            count = store.ingest(translation, verses)
+        except (RuntimeError, KeyError, ValueError, RequestException) as e:
+            print(f"Could not ingest {translation}: {e}")
+            continue
+
+        print(f"Ingested {count} verses of {translation}")
+
+
+@app.cli.command("refresh-metadata")
+def refresh_metadata():
+    """Fetches the book and translation catalog and saves a new snapshot"""
+
+    if metadata.refresh():
+        print(f"Saved metadata snapshot to {metadata.snapshot_path}")
+    else:
+        print("Could not refresh metadata, keeping the current snapshot")
+
+
+@app.cli.command("warm-cache")
+@click.option(
+    "--translation",
+    "translations",
+    multiple=True,
+    help="Warm every chapter of this translation instead of the favorites.",
+)
+@click.option(
+    "--workers", type=int, default=cache_warmer.WORKERS, help="Concurrent fetches."
+)
+@click.option(
+    "--rate",
+    type=float,
+    default=cache_warmer.RATE,
+    help="Upstream requests per second, 0 for no limit.",
+)
+@click.option("--restart", is_flag=True, help="Ignore the progress of an earlier run.")
+def warm_cache(translations, workers, rate, restart):
+    """
+    Fetches the chapters favorites point at, or whole translations, into
+    the chapter cache ahead of readers
+    """
+
+    warmer = cache_warmer.CacheWarmer(workers=workers, rate=rate)
+    if restart and os.path.exists(warmer.progress_path):
+        os.remove(warmer.progress_path)
+
+    if translations:
+        keys = []
+        for translation in translations:
+            keys.extend(cache_warmer.translation_keys(translation, metadata.books()))
+    else:
+        keys = cache_warmer.favorite_keys(db.session, Favorite)
+
+    print(f"Warming {len(keys)} chapters")
+    summary = warmer.run(keys)
+
+    print(
+        f"Fetched {summary['fetched']}, skipped {summary['skipped']}, "
+        f"failed {len(summary['failed'])}"
+    )
+    for (translation, book, chapter), error in summary["failed"][:20]:
+        print(f"  {translation} {metadata.book_name(book)} {chapter}: {error}")
+    if summary["failed"]:
+        print(f"Run again to retry the failures, progress is in {warmer.progress_path}")
@@ -0,0 +1,202 @@
+"""Index benchmark for Scripture Sanctuary.
+
+Seeds a scratch database with large users/favorites/tags tables and records
+query plans and timings for the profile, tag and cascade delete queries
+without the lookup indexes and then with them:
+
+    createdb scripture-sanctuary-bench
+    python bench_indexes.py --db postgresql:///scripture-sanctuary-bench
+
+Never point --db at a database you care about, its tables are dropped.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+from models import db, Favorite, FavoriteTag, Tag, User
+
+LOOKUP_INDEXES = [
+    ("ix_favorites_user_id_created_at", "favorites", "user_id, created_at"),
+    ("ix_favorite_tags_tag_id", "favorite_tags", "tag_id"),
+    ("ix_tags_user_id", "tags", "user_id"),
+]
+
+QUERIES = {
+    "profile_favorites": (
+        "SELECT * FROM favorites WHERE user_id = :user_id ORDER BY created_at DESC"
+    ),
+    "profile_tags": (
+        "SELECT * FROM tags WHERE id IN ("
+        "SELECT id FROM tags WHERE user_id = :user_id UNION "
+        "SELECT favorite_tags.tag_id FROM favorite_tags "
+        "JOIN favorites ON favorites.id = favorite_tags.favorite_id "
+        "WHERE favorites.user_id = :user_id)"
+    ),
+    "tag_favorites": (
+        "SELECT favorites.* FROM favorites "
+        "JOIN favorite_tags ON favorites.id = favorite_tags.favorite_id "
+        "WHERE favorite_tags.tag_id = :tag_id"
+    ),
+    "tag_cascade_delete": "DELETE FROM favorite_tags WHERE tag_id = :tag_id",
+}
+
+
+def seed(engine, users, favorites_per_user, tags_per_user, batch=10_000):
+    """Recreates the tables and fills them with generated rows"""
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    rng = random.Random(42)
+    now = datetime.now()
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": u,
+                    "username": f"user{u}",
+                    "password": "x",
+                    "email": f"user{u}@example.com",
+                }
+                for u in range(1, users + 1)
+            ],
+        )
+        conn.execute(
+            insert(Tag),
+            [
+                {"id": t, "user_id": (t - 1) // tags_per_user + 1, "name": f"tag{t}"}
+                for t in range(1, users * tags_per_user + 1)
+            ],
+        )
+
+        favorite_id = 0
+        rows, links = [], []
+        for u in range(1, users + 1):
+            for _ in range(favorites_per_user):
+                favorite_id += 1
+                rows.append(
+                    {
+                        "id": favorite_id,
+                        "user_id": u,
+                        "book": rng.randint(1, 66),
+                        "chapter": rng.randint(1, 20),
+                        "start": rng.randint(1, 20),
+                        "translation": "NIV",
+                        "created_at": now - timedelta(minutes=favorite_id),
+                    }
+                )
+                for tag_id in rng.sample(range(1, users * tags_per_user + 1), 2):
+                    links.append({"favorite_id": favorite_id, "tag_id": tag_id})
+
+                if len(rows) >= batch:
+                    conn.execute(insert(Favorite), rows)
+                    conn.execute(insert(FavoriteTag), links)
+                    rows, links = [], []
+
+        if rows:
+            conn.execute(insert(Favorite), rows)
+            conn.execute(insert(FavoriteTag), links)
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE"))
+
+
+def set_indexes(engine, present):
+    with engine.begin() as conn:
+        for name, table, columns in LOOKUP_INDEXES:
+            if present:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+            else:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE"))
+
+
+def explain(conn, sql, params):
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(text(f"EXPLAIN ANALYZE {sql}"), params)
+        return [row[0] for row in rows]
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)
+    return [row[-1] for row in rows]
+
+
+def measure(engine, users, tags, repeat):
+    """Median/p95 milliseconds and the query plan of each query"""
+    rng = random.Random(7)
+    results = {}
+
+    for name, sql in QUERIES.items():
+        timings = []
+
+        with engine.connect() as conn:
+            params = {"user_id": rng.randint(1, users), "tag_id": rng.randint(1, tags)}
+            plan = explain(conn, sql, params)
+            conn.rollback()
+
+            for _ in range(repeat):
+                params = {"user_id": rng.randint(1, users), "tag_id": rng.randint(1, tags)}
+                start = time.perf_counter()
+                result = conn.execute(text(sql), params)
+                if result.returns_rows:
+                    result.fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+                # keep the tables identical between runs
+                conn.rollback()
+
+        timings.sort()
+        results[name] = {
+            "median_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+            "plan": plan,
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="postgresql:///scripture-sanctuary-bench")
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--favorites-per-user", type=int, default=200)
+    parser.add_argument("--tags-per-user", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", default="bench_indexes.json")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db)
+    tags = args.users * args.tags_per_user
+
+    print(f"Seeding {args.users * args.favorites_per_user} favorites...")
+    seed(engine, args.users, args.favorites_per_user, args.tags_per_user)
+
+    report = {
+        "dialect": engine.dialect.name,
+        "users": args.users,
+        "favorites": args.users * args.favorites_per_user,
+        "tags": tags,
+    }
+
+    for phase, present in (("before", False), ("after", True)):
+        set_indexes(engine, present)
+        report[phase] = measure(engine, args.users, tags, args.repeat)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name in QUERIES:
+        before = report["before"][name]["median_ms"]
+        after = report["after"][name]["median_ms"]
+        print(f"{name:20} {before:10.3f} ms -> {after:10.3f} ms")
+
+    print(f"Plans and timings written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""Route benchmark for Scripture Sanctuary.
+
+Starts the bolls.life stand-in from stub_bolls.py, seeds a scratch database
+at several sizes and records latency percentiles and SQL statement counts
+for the main pages, through the Flask test client:
+
+    python bench_routes.py --output bench_routes.json
+    python bench_routes.py --sizes 10 1k --baseline bench_routes.json
+
+A size is how many favorites the profiled user has. Every size also gets
+tags of 10, 100 and 500 favorites, none shared between them, and a list of
+users. A tag route reads every page of its tag through the ?after= links,
+so its numbers are for the whole tag. Each route is requested once with
+cold caches and then --repeat times; the results go to --output as JSON,
+and --baseline prints the change against an earlier run so a regression
+shows up between commits.
+
+Never point --db at a database you care about, its tables are dropped.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from stub_bolls import StubBolls
+
+SIZES = {"10": 10, "1k": 1_000, "100k": 100_000}
+TAG_SIZES = [10, 100, 500]
+USERS = 200
+# generated rows are inserted this many at a time
+BATCH = 10_000
+
+READER_ID = 1
+TAGGER_ID = 2
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def random_passage(rng, books):
+    book = rng.choice(books)
+    start = rng.randint(1, 20)
+    length = rng.randint(0, 5)
+    return {
+        "translation": "KJV",
+        "book": book["bookid"],
+        "chapter": rng.randint(1, book["chapters"]),
+        "start": start,
+        "end": start + length if length else None,
+    }
+
+
+def seed(db, models, size, books, password):
+    """
+    Recreates the tables: USERS users, READER_ID with size favorites and
+    TAGGER_ID with the favorites of the TAG_SIZES tags, each tag its own.
+    Returns {"favorites": [READER_ID favorite ids], "tags": {size: tag id}}
+    """
+    User, Favorite, Tag, FavoriteTag = models
+    rng = random.Random(42)
+    now = datetime.now()
+
+    db.drop_all()
+    db.create_all()
+
+    with db.engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": u,
+                    "username": f"user{u}",
+                    "password": password,
+                    "email": f"user{u}@example.com",
+                    "first_name": "User",
+                    "last_name": str(u),
+                }
+                for u in range(1, USERS + 1)
+            ],
+        )
+
+        favorite_id = 0
+        for user_id, count in ((READER_ID, size), (TAGGER_ID, sum(TAG_SIZES))):
+            rows = []
+            for _ in range(count):
+                favorite_id += 1
+                rows.append(
+                    {
+                        "id": favorite_id,
+                        "user_id": user_id,
+                        "created_at": now - timedelta(minutes=favorite_id),
+                        **random_passage(rng, books),
+                    }
+                )
+                if len(rows) >= BATCH:
+                    conn.execute(insert(Favorite), rows)
+                    rows = []
+            if rows:
+                conn.execute(insert(Favorite), rows)
+
+        first_tagged = size + 1
+        tags = {}
+        for tag_id, tag_size in enumerate(TAG_SIZES, 1):
+            conn.execute(
+                insert(Tag),
+                [{"id": tag_id, "user_id": TAGGER_ID, "name": f"tag{tag_size}"}],
+            )
+            conn.execute(
+                insert(FavoriteTag),
+                [
+                    {"favorite_id": first_tagged + n, "tag_id": tag_id}
+                    for n in range(tag_size)
+                ],
+            )
+            tags[tag_size] = tag_id
+            first_tagged += tag_size
+
+    sample = rng.sample(range(1, size + 1), min(size, 20))
+    return {"favorites": sample, "tags": tags}
+
+
+def summarize(timings, queries, errors, first_ms, size_bytes):
+    timings = sorted(timings)
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "first_ms": round(first_ms, 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(cuts[49], 3),
+        "p90_ms": round(cuts[89], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "max_ms": round(timings[-1], 3),
+        "queries": statistics.median(queries),
+        "max_queries": max(queries),
+        "errors": errors,
+        "bytes": size_bytes,
+    }
+
+
+def fetch(client, method, path, data, all_pages):
+    """
+    Requests path, and with all_pages every following page through its
+    ?after= link. Returns (highest status, bytes read)
+    """
+    status, size_bytes = 0, 0
+    next_page = re.compile(rf'href="({re.escape(path)}\?after=[^"]+)"')
+
+    while path:
+        resp = client.open(path, method=method, data=data)
+        # streamed pages only render while the body is read
+        body = resp.get_data()
+        status = max(status, resp.status_code)
+        size_bytes += len(body)
+
+        match = next_page.search(body.decode()) if all_pages else None
+        path = match and match.group(1)
+
+    return status, size_bytes
+
+
+def measure(client, engine, QueryCounter, requests, repeat, all_pages=False):
+    """
+    Latency and statement counts of requests, a list of (method, path, data)
+    cycled through: the first request is reported as first_ms, the next
+    repeat make up the distribution. With all_pages a request covers every
+    page of a paginated list.
+    """
+    timings, queries = [], []
+    errors = 0
+    first_ms = None
+    size_bytes = 0
+
+    for i in range(repeat + 1):
+        method, path, data = requests[i % len(requests)]
+
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            status, body_bytes = fetch(client, method, path, data, all_pages)
+            elapsed = (time.perf_counter() - start) * 1000
+
+        if status >= 400:
+            errors += 1
+
+        if first_ms is None:
+            first_ms = elapsed
+            continue
+
+        timings.append(elapsed)
+        queries.append(counter.count)
+        size_bytes = body_bytes
+
+    return summarize(timings, queries, errors, first_ms, size_bytes)
+
+
+def route_requests(seeded, books, rng):
+    """{route name: ([(method, path, data), ...], all pages)}"""
+    searches = []
+    for _ in range(20):
+        passage = random_passage(rng, books)
+        searches.append(
+            (
+                "POST",
+                "/search",
+                {
+                    "book": str(passage["book"]),
+                    "chapter": passage["chapter"],
+                    "start_verse": passage["start"],
+                    "end_verse": passage["end"] or "",
+                    "translation": passage["translation"],
+                },
+            )
+        )
+
+    routes = {
+        "GET /search": ([("GET", "/search", None)], False),
+        "POST /search": (searches, False),
+        "/favorites/<id>": (
+            [
+                ("GET", f"/favorites/{favorite_id}", None)
+                for favorite_id in seeded["favorites"]
+            ],
+            False,
+        ),
+    }
+    for tag_size, tag_id in seeded["tags"].items():
+        routes[f"/tags/<id> [{tag_size}]"] = ([("GET", f"/tags/{tag_id}", None)], True)
+    routes["/users/<id>"] = ([("GET", f"/users/{READER_ID}", None)], False)
+    routes["/users"] = ([("GET", "/users", None)], False)
+
+    return routes
+
+
+def compare(report, baseline):
+    """Prints p50 and query count changes against an earlier report"""
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+
+    for size, routes in report["sizes"].items():
+        for route, result in routes.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(route)
+            if before is None:
+                continue
+
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+            flag = " !" if change > 20 or result["queries"] > before["queries"] else ""
+            print(
+                f"{size:>5} {route:22} p50 {before['p50_ms']:8.2f} -> "
+                f"{result['p50_ms']:8.2f} ms ({change:+.0f}%)  queries "
+                f"{before['queries']:g} -> {result['queries']:g}{flag}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="scratch database, a temporary SQLite file by default")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub seconds per request")
+    parser.add_argument("--chapters", help="directory of recorded chapter JSON for the stub")
+    parser.add_argument("--output", default="bench_routes.json")
+    parser.add_argument("--baseline", help="earlier --output to compare with")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read baseline {args.baseline}: {e}", file=sys.stderr)
+
+    workdir = tempfile.mkdtemp(prefix="bench-routes-")
+    stub = StubBolls(latency=args.latency, chapters_dir=args.chapters)
+    cache_dir = os.path.join(workdir, "chapter_cache")
+
+    # the app reads its configuration at import
+    os.environ.update(
+        BOLLS_BASE_URL=stub.start(),
+        SUPABASE_DB_URI=args.db or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        CHAPTER_CACHE_DIR=cache_dir,
+        SCRIPTURE_STORE_PATH=os.path.join(workdir, "store.sqlite3"),
+        METADATA_SNAPSHOT_PATH=os.path.join(workdir, "metadata.json"),
+        BCRYPT_LOG_ROUNDS="4",
+    )
+
+    from app import app
+    from chapter_cache import chapter_cache
+    from fragment_cache import fragment_cache
+    from identity_cache import identity_cache
+    from models import db, User, Favorite, Tag, FavoriteTag
+    from password_hasher import hash_password
+    from query_counter import QueryCounter
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.config["DEBUG_TB_ENABLED"] = False
+    password = hash_password("password", 4)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "dialect": db.engine.dialect.name,
+        "repeat": args.repeat,
+        "stub_latency": args.latency,
+        "sizes": {},
+    }
+
+    try:
+        for name in args.sizes:
+            print(f"Seeding {SIZES[name]} favorites...")
+            seeded = seed(
+                db, (User, Favorite, Tag, FavoriteTag), SIZES[name], stub.books, password
+            )
+
+            client = app.test_client()
+            routes = route_requests(seeded, stub.books, random.Random(7))
+            results = report["sizes"][name] = {}
+
+            for route, (requests, all_pages) in routes.items():
+                # every route's first request is cold, not warmed by the last
+                chapter_cache.memory.clear()
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                fragment_cache.clear()
+                identity_cache.entries.clear()
+
+                results[route] = measure(
+                    client, db.engine, QueryCounter, requests, args.repeat, all_pages
+                )
+                r = results[route]
+                print(
+                    f"{name:>5} {route:22} p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  "
+                    f"p99 {r['p99_ms']:8.2f} ms  queries {r['queries']:g}"
+                )
+    finally:
+        stub.stop()
+        db.session.remove()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
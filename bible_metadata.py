@@ -0,0 +1,159 @@
+"""Registry of bible books and translations.
+
+The catalog is read from a versioned local snapshot so workers boot without
+touching bolls.life. A background thread refreshes the snapshot once it is
+older than REFRESH_INTERVAL. The seed snapshot shipped in data/ is used until
+the first refresh succeeds.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from api_requests import get_books, get_translations
+
+SNAPSHOT_VERSION = 1
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED_PATH = os.path.join(BASE_DIR, "data", "metadata_seed.json")
+SNAPSHOT_PATH = os.environ.get(
+    "METADATA_SNAPSHOT_PATH",
+    os.path.join(BASE_DIR, "instance", "metadata_snapshot.json"),
+)
+REFRESH_INTERVAL = int(os.environ.get("METADATA_REFRESH_INTERVAL", 24 * 60 * 60))
+
+
+class MetadataRegistry:
+    """Books and translations loaded once per process from a snapshot"""
+
+    def __init__(
+        self,
+        snapshot_path=SNAPSHOT_PATH,
+        seed_path=SEED_PATH,
+        fetch_books=get_books,
+        fetch_translations=get_translations,
+        refresh_interval=REFRESH_INTERVAL,
+    ):
+        self.snapshot_path = snapshot_path
+        self.seed_path = seed_path
+        self.fetch_books = fetch_books
+        self.fetch_translations = fetch_translations
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._books_by_id = {}
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_pid = None
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if snapshot.get("version") != SNAPSHOT_VERSION or not snapshot.get("books"):
+            return None
+
+        return snapshot
+
+    def _use(self, snapshot):
+        self._books_by_id = {book["bookid"]: book for book in snapshot["books"]}
+        self._snapshot = snapshot
+
+    def snapshot(self):
+        """Returns the current snapshot, loading it on first use"""
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    snapshot = self._read(self.snapshot_path) or self._read(
+                        self.seed_path
+                    )
+                    if snapshot is None:
+                        raise RuntimeError("No bible metadata snapshot available")
+                    self._use(snapshot)
+
+        if self.is_stale():
+            self.refresh_in_background()
+
+        return self._snapshot
+
+    def is_stale(self):
+        return time.time() - self._snapshot["fetched_at"] > self.refresh_interval
+
+    def refresh(self):
+        """
+        Fetches the catalog from bolls.life and persists a new snapshot.
+        Returns True on success, the current snapshot is kept otherwise.
+        """
+        try:
+            books = self.fetch_books()
+            translations = self.fetch_translations()
+        except Exception as e:
+            print(f"Error refreshing bible metadata: {e}")
+            return False
+
+        if not books or not translations:
+            return False
+
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "source": "bolls.life",
+            "fetched_at": time.time(),
+            "books": books,
+            "translations": translations,
+        }
+
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Error saving bible metadata snapshot: {e}")
+
+        with self._lock:
+            self._use(snapshot)
+
+        return True
+
+    def refresh_in_background(self):
+        """Starts at most one refresh thread per process"""
+        with self._lock:
+            if self._refreshing and self._refresh_pid == os.getpid():
+                return
+            self._refreshing = True
+            self._refresh_pid = os.getpid()
+
+        def run():
+            try:
+                if not self.refresh():
+                    # try again on the next access after a short pause
+                    time.sleep(60)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="metadata-refresh", daemon=True).start()
+
+    def books(self):
+        """{"bookid", "name", "chapters", ...} for the 66 books"""
+        return self.snapshot()["books"]
+
+    def translations(self):
+        """{"short_name", "full_name"} for the most read translations"""
+        return self.snapshot()["translations"]
+
+    def book(self, book_id):
+        self.snapshot()
+        return self._books_by_id.get(int(book_id))
+
+    def book_name(self, book_id):
+        book = self.book(book_id)
+        return book["name"] if book else f"Book {book_id}"
+
+
+metadata = MetadataRegistry()
@@ -0,0 +1,170 @@
+"""Prefills the chapter cache ahead of readers.
+
+After a deploy or a cache flush the first reader of every favorite waits
+for bolls.life. `flask warm-cache` fetches those chapters beforehand, either
+every chapter some favorite points at or every chapter of whole
+translations, on a few threads and at a bounded request rate.
+
+Keys that are done are appended to a progress file, so an interrupted run
+picks up where it stopped. The file is removed once a run finishes without
+failures.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+from api_requests import refresh_chapter
+from chapter_cache import chapter_cache
+from scripture_store import store
+
+PROGRESS_PATH = os.environ.get(
+    "WARM_CACHE_PROGRESS_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "instance", "warm_cache.progress"
+    ),
+)
+WORKERS = int(os.environ.get("WARM_CACHE_WORKERS", 4))
+# upstream requests per second across all workers, 0 for no limit
+RATE = float(os.environ.get("WARM_CACHE_RATE", 5))
+
+FETCHED = "fetched"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def favorite_keys(session, Favorite):
+    """Distinct (translation, book, chapter) of every favorite"""
+    rows = (
+        session.query(Favorite.translation, Favorite.book, Favorite.chapter)
+        .distinct()
+        .order_by(Favorite.translation, Favorite.book, Favorite.chapter)
+    )
+    return [(translation, int(book), int(chapter)) for translation, book, chapter in rows]
+
+
+def translation_keys(translation, books):
+    """Every chapter of a translation, from the book list's chapter counts"""
+    return [
+        (translation, int(book["bookid"]), chapter)
+        for book in books
+        for chapter in range(1, book["chapters"] + 1)
+    ]
+
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1 / rate seconds apart across threads"""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rate if rate else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+
+        if start > now:
+            self.sleep(start - now)
+
+
+class CacheWarmer:
+    def __init__(
+        self,
+        progress_path=PROGRESS_PATH,
+        workers=WORKERS,
+        rate=RATE,
+        fetch=refresh_chapter,
+    ):
+        self.progress_path = progress_path
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.fetch = fetch
+
+    def read_progress(self):
+        """Keys finished by an earlier run"""
+        done = set()
+
+        try:
+            with open(self.progress_path, encoding="utf-8") as f:
+                for line in f:
+                    translation, book, chapter = line.split()
+                    done.add((translation, int(book), int(chapter)))
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            print(f"Ignoring unreadable progress file {self.progress_path}: {e}")
+
+        return done
+
+    def is_cached(self, key):
+        """Served locally already, from the store or a fresh shared cache entry"""
+        return store.has_translation(key[0]) or chapter_cache.disk.is_fresh(key)
+
+    def warm_one(self, key):
+        """Returns (FETCHED, SKIPPED or FAILED, error message or None)"""
+        if self.is_cached(key):
+            return SKIPPED, None
+
+        self.limiter.wait()
+
+        try:
+            verses = self.fetch(*key)
+        except RequestException as e:
+            return FAILED, str(e)
+
+        if verses is None:
+            return FAILED, "not found upstream"
+
+        return FETCHED, None
+
+    def run(self, keys, report=print):
+        """
+        Warms keys, skipping those done by an earlier run.
+        Returns {"fetched": n, "skipped": n, "failed": [(key, error)]}
+        """
+        keys = list(dict.fromkeys(keys))
+        done = self.read_progress()
+        todo = [key for key in keys if key not in done]
+        summary = {FETCHED: 0, SKIPPED: len(keys) - len(todo), FAILED: []}
+
+        if done:
+            report(f"Resuming, {len(done)} chapters already done")
+
+        os.makedirs(os.path.dirname(self.progress_path) or ".", exist_ok=True)
+
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="warm-cache")
+
+        with open(self.progress_path, "a", encoding="utf-8") as progress:
+            try:
+                # results come back in order, only this thread writes progress
+                for i, (key, (outcome, error)) in enumerate(
+                    zip(todo, pool.map(self.warm_one, todo)), 1
+                ):
+                    if outcome == FAILED:
+                        summary[FAILED].append((key, error))
+                    else:
+                        summary[outcome] += 1
+                        progress.write("%s %d %d\n" % key)
+                        progress.flush()
+
+                    if i % 100 == 0:
+                        report(f"{i}/{len(todo)} chapters")
+            finally:
+                # on Ctrl-C only the chapters already being fetched finish
+                pool.shutdown(cancel_futures=True)
+
+        if not summary[FAILED]:
+            os.remove(self.progress_path)
+
+        return summary
@@ -0,0 +1,294 @@
+"""Two-tier cache for whole bible chapters.
+
+The memory layer is a bounded LRU of CompactChapters private to each process.
+The disk layer is a directory of JSON files shared by every gunicorn worker
+on the machine. Keys are (translation, book, chapter).
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from compact_chapter import CompactChapter
+
+CACHE_DIR = os.environ.get(
+    "CHAPTER_CACHE_DIR",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "instance", "chapter_cache"
+    ),
+)
+# Compact chapters take about a third of the memory of parsed JSON
+MEMORY_ENTRIES = int(os.environ.get("CHAPTER_CACHE_SIZE", 1536))
+MEMORY_TTL = int(os.environ.get("CHAPTER_CACHE_TTL", 60 * 60))
+DISK_TTL = int(os.environ.get("CHAPTER_CACHE_DISK_TTL", 7 * 24 * 60 * 60))
+DISK_BYTES = int(os.environ.get("CHAPTER_CACHE_DISK_BYTES", 256 * 1024 * 1024))
+
+# Bumped whenever the shape of cached chapters changes
+# 2: verse text is stored with Strong's tags already stripped
+CACHE_FORMAT = 2
+
+
+class LRUCache:
+    """Thread safe, size bounded LRU with a time to live per entry"""
+
+    def __init__(self, max_entries=MEMORY_ENTRIES, ttl=MEMORY_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class DiskCache:
+    """
+    JSON file per key, written atomically so readers in other processes
+    never see a partial file. Expiry uses file mtimes and the oldest files
+    are removed once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=DISK_TTL, max_bytes=DISK_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def path(self, key):
+        translation, book, chapter = key
+        translation = re.sub(r"[^A-Za-z0-9_-]", "_", str(translation))
+        return os.path.join(
+            self.directory,
+            f"v{CACHE_FORMAT}",
+            translation,
+            str(int(book)),
+            f"{int(chapter)}.json",
+        )
+
+    def get(self, key, allow_stale=False):
+        """
+        Returns the cached value or None.
+        allow_stale: serve expired entries, e.g. while upstream is down
+        """
+        path = self.path(key)
+
+        try:
+            age = time.time() - os.path.getmtime(path)
+
+            if age > self.ttl and not allow_stale:
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def is_fresh(self, key):
+        """Whether key is cached and not expired, without reading it"""
+        try:
+            return time.time() - os.path.getmtime(self.path(key)) <= self.ttl
+        except OSError:
+            return False
+
+    def set(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # an overwritten entry no longer counts towards the size
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += os.path.getsize(path) - replaced
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def _scan_size(self):
+        size = 0
+        for path in self._files():
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _evict(self):
+        """Removes the oldest files until the cache is back to 90% of max_bytes"""
+        files = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+        size = sum(f[1] for f in files)
+        target = self.max_bytes * 0.9
+
+        for _, file_size, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            self.evictions += 1
+
+        self._size = size
+
+    def clear(self):
+        for path in list(self._files()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._size = 0
+
+    def stats(self):
+        return {
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ChapterCache:
+    """
+    Memory LRU in front of the shared disk cache. Chapters come back as
+    CompactChapters whichever layer they were found in.
+    """
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk if disk is not None else DiskCache()
+
+    def get(self, key):
+        value = self.memory.get(key)
+
+        if value is None:
+            value = self.disk.get(key)
+
+            if value is not None:
+                value = CompactChapter.from_verses(value)
+                self.memory.set(key, value)
+
+        return value
+
+    def set(self, key, value, shared=True):
+        """
+        Caches a chapter, given as a list of verse dicts or a CompactChapter,
+        and returns it compacted.
+        shared: also write it to the disk cache for the other workers
+        """
+        chapter = CompactChapter.from_verses(value)
+        self.memory.set(key, chapter)
+
+        if shared:
+            self.disk.set(key, value if isinstance(value, list) else chapter.to_list())
+
+        return chapter
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+    def stats(self):
+        return {"memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+chapter_cache = ChapterCache()
@@ -0,0 +1,170 @@
+"""Compact in-memory representation of a bible chapter.
+
+A chapter parsed from JSON is a list of dicts, one per verse, each with its
+own str objects. CompactChapter keeps the whole chapter as one UTF-8 buffer
+with an array of verse offsets, so a cached chapter is a handful of objects
+instead of a few hundred, and a verse range is a view over the same buffer.
+"""
+
+from array import array
+
+# pk is optional in the bolls.life shape
+NO_PK = -1
+
+
+class Verse:
+    """One verse, read like the bolls.life dict: verse.text or verse["text"]"""
+
+    __slots__ = ("verse", "text", "pk")
+
+    def __init__(self, verse, text, pk=None):
+        self.verse = verse
+        self.text = text
+        self.pk = pk
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __eq__(self, other):
+        if isinstance(other, Verse):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"Verse({self.verse!r}, {self.text!r})"
+
+    def to_dict(self):
+        return {"pk": self.pk, "verse": self.verse, "text": self.text}
+
+
+class CompactChapter:
+    """A chapter as one UTF-8 buffer plus per-verse offsets, numbers and pks"""
+
+    __slots__ = ("buffer", "offsets", "numbers", "pks")
+
+    def __init__(self, buffer, offsets, numbers, pks):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.numbers = numbers
+        self.pks = pks
+
+    @classmethod
+    def from_verses(cls, verses):
+        """From a list of {"pk"?, "verse", "text"}, or a chapter as is"""
+        if isinstance(verses, cls):
+            return verses
+
+        parts = []
+        offsets = array("I", [0])
+        numbers = array("H")
+        pks = array("q")
+        end = 0
+
+        for verse in verses:
+            encoded = verse["text"].encode("utf-8")
+            parts.append(encoded)
+            end += len(encoded)
+            offsets.append(end)
+            numbers.append(int(verse["verse"]))
+            pk = verse.get("pk")
+            pks.append(NO_PK if pk is None else pk)
+
+        return cls(b"".join(parts), offsets, numbers, pks)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __iter__(self):
+        return self.iter_range(0, len(self))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("chapter slices can't have a step")
+            return VerseRange(self, start, max(start, stop))
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("verse index out of range")
+
+        return self.verse(index)
+
+    def text(self, index):
+        return self.buffer[self.offsets[index] : self.offsets[index + 1]].decode(
+            "utf-8"
+        )
+
+    def verse(self, index):
+        pk = self.pks[index]
+        return Verse(self.numbers[index], self.text(index), None if pk == NO_PK else pk)
+
+    def iter_range(self, start, stop):
+        for index in range(start, stop):
+            yield self.verse(index)
+
+    def select(self, start_verse, end_verse):
+        """
+        Verses by position, like the original list lookups:
+        start and end -> start..end, start -> that verse, end -> 1..end,
+        neither -> the whole chapter. Raises IndexError when out of range.
+        """
+        count = len(self)
+
+        if start_verse and end_verse:
+            start, stop = start_verse - 1, end_verse
+        elif start_verse:
+            start, stop = start_verse - 1, start_verse
+        elif end_verse:
+            start, stop = 0, end_verse
+        else:
+            start, stop = 0, count
+
+        if start < 0 or stop > count or start >= stop:
+            raise IndexError("verse out of range")
+
+        return VerseRange(self, start, stop)
+
+    def to_list(self):
+        """The bolls.life shape, e.g. for the JSON disk cache"""
+        return [verse.to_dict() for verse in self]
+
+
+class VerseRange:
+    """A run of verses in a chapter, sharing the chapter's buffer"""
+
+    __slots__ = ("chapter", "start", "stop")
+
+    def __init__(self, chapter, start, stop):
+        self.chapter = chapter
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return self.chapter.iter_range(self.start, self.stop)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("verse ranges can't have a step")
+            return VerseRange(
+                self.chapter, self.start + start, self.start + max(start, stop)
+            )
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("verse index out of range")
+
+        return self.chapter.verse(self.start + index)
+
+    def to_list(self):
+        return [verse.to_dict() for verse in self]
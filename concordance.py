@@ -0,0 +1,93 @@
+"""Strong's number concordance over translations in the local scripture store.
+
+Only translations ingested with Strong's tags (KJV, YLT, ...) have entries.
+Each one gets an in-process index: Strong's number -> array of verse ids, in
+reading order. Like the search index it is rebuilt only when its own
+translation is re-ingested.
+"""
+
+from array import array
+
+from scripture_store import store
+from store_indexes import StoreIndexes
+from strongs import normalize
+
+
+class TranslationConcordance:
+    """Strong's number to verse lookup for one translation"""
+
+    def __init__(self, translation, version):
+        self.translation = translation
+        self.version = version
+        self.books = array("B")
+        self.chapters = array("H")
+        self.verses = array("H")
+        self.texts = []
+        self.entries = {}
+
+    @classmethod
+    def build(cls, translation, version, rows):
+        """rows: (book, chapter, verse, text, ["G26", ...]) in reading order"""
+        concordance = cls(translation, version)
+
+        for doc_id, (book, chapter, verse, text, numbers) in enumerate(rows):
+            concordance.books.append(book)
+            concordance.chapters.append(chapter)
+            concordance.verses.append(verse)
+            concordance.texts.append(text)
+
+            # a number repeated within a verse is listed once
+            for number in dict.fromkeys(numbers):
+                if number not in concordance.entries:
+                    concordance.entries[number] = array("I")
+                concordance.entries[number].append(doc_id)
+
+        return concordance
+
+    def __len__(self):
+        return len(self.entries)
+
+    def result(self, doc):
+        return {
+            "translation": self.translation,
+            "book": self.books[doc],
+            "chapter": self.chapters[doc],
+            "verse": self.verses[doc],
+            "text": self.texts[doc],
+        }
+
+
+class Concordance(StoreIndexes):
+    """Builds and queries one TranslationConcordance per ingested translation"""
+
+    def __init__(self, store=store):
+        super().__init__(store)
+
+    def build(self, translation, version):
+        return TranslationConcordance.build(
+            translation, version, self.store.iter_strongs(translation)
+        )
+
+    def lookup(self, number, translation, limit=100, offset=0):
+        """
+        Returns the verses tagged with a Strong's number:
+        {"number", "translation", "total", "results": [{"translation",
+        "book", "chapter", "verse", "text"}]}
+        None if the number is not a Strong's number.
+        """
+        number = normalize(number)
+        if number is None:
+            return None
+
+        index = self.index(translation)
+        docs = index.entries.get(number, ()) if index is not None else ()
+
+        return {
+            "number": number,
+            "translation": translation,
+            "total": len(docs),
+            "results": [index.result(doc) for doc in docs[offset : offset + limit]],
+        }
+
+
+concordance = Concordance()
@@ -0,0 +1,73 @@
+"""Conditional GETs (ETag / Last-Modified / 304) for pages built from rows.
+
+A passage's text never changes for a given (translation, book, chapter,
+range), so a favorite or tag page only changes when its rows do. The ETag
+is a hash of the passage keys, the row versions (updated_at) and who is
+looking, and it's worked out from a couple of cheap queries before any
+chapter is fetched or any template rendered. A matching If-None-Match gets
+an empty 304.
+"""
+
+import hashlib
+import os
+from datetime import timezone
+
+from flask import Response, g, request, session
+
+# Bump on deploys that change how these pages render
+PAGE_VERSION = os.environ.get("PAGE_VERSION", "1")
+
+
+def page_etag(parts):
+    """Strong ETag for a page, from anything with a stable repr"""
+    viewer = (g.user.id, g.user.profile_img_url) if g.user else None
+    raw = repr((PAGE_VERSION, viewer, parts)).encode()
+    return hashlib.sha1(raw).hexdigest()[:32]
+
+
+def http_time(moment):
+    """updated_at columns are naive local times, HTTP dates are whole UTC seconds"""
+    return moment.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def is_fresh(etag, last_modified):
+    """Whether the client's copy is still current"""
+    if request.if_none_match:
+        # If-Modified-Since is ignored when If-None-Match is sent
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since and last_modified:
+        return http_time(last_modified) <= request.if_modified_since
+
+    return False
+
+
+def conditional_page(parts, last_modified, render):
+    """
+    Returns a 304 when the client already has this version of the page,
+    otherwise render(), with validators and Cache-Control either way.
+    Pages with pending flash messages are always rendered and not stored.
+    """
+    if session.get("_flashes"):
+        response = render()
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    etag = page_etag(parts)
+
+    if is_fresh(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = render()
+        if response.status_code != 200:
+            return response
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = http_time(last_modified)
+    # the owner sees edit buttons, so signed in pages stay out of shared caches
+    response.headers["Cache-Control"] = (
+        "private, no-cache" if g.user else "public, no-cache"
+    )
+
+    return response
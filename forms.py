@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import (
     EmailField,
     PasswordField,
@@ -8,39 +9,102 @@ from wtforms import (
     IntegerField,
 )
 from wtforms.validators import DataRequired, Optional, NumberRange, Length
-from api_requests import get_books, get_translations
+from bible_metadata import metadata
+from scripture_store import store
 
-# list of bible translations
-TRANSLATIONS = get_translations()
-# list of bible books
-BOOKS = get_books()
 
-TRANSLATIONS_TUPLES = [
-    (
-        f"{t['short_name']}",
+def translation_choices():
+    """(short_name, label) for the translation dropdown"""
+    return [
         (
-            f"{t['short_name']} - {t['full_name']}"
-            if t["short_name"] != "KJV"
-            else f"{t['short_name']} - King James Version, 1769"
-        ),
-    )
-    for t in TRANSLATIONS
-]
+            f"{t['short_name']}",
+            (
+                f"{t['short_name']} - {t['full_name']}"
+                if t["short_name"] != "KJV"
+                else f"{t['short_name']} - King James Version, 1769"
+            ),
+        )
+        for t in metadata.translations()
+    ]
+
 
-BOOKS_TUPLES = [(f"{b['bookid']}", f"{b['name']}") for b in BOOKS]
+def book_choices():
+    """(bookid, name) for the book dropdown"""
+    return [(f"{b['bookid']}", f"{b['name']}") for b in metadata.books()]
 
 
 class SearchForm(FlaskForm):
-    book = SelectField("Book", choices=BOOKS_TUPLES, validators=[DataRequired()])
+    book = SelectField("Book", validators=[DataRequired()])
     chapter = IntegerField("Chapter", validators=[DataRequired(), NumberRange(min=1)])
     start_verse = IntegerField(
         "From Verse", validators=[Optional(), NumberRange(min=1)]
     )
     end_verse = IntegerField("To Verse", validators=[Optional(), NumberRange(min=1)])
+    translation = SelectField("Bible Translation", validators=[DataRequired()])
+    search = SubmitField("Find Verse")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # choices follow the metadata registry as it refreshes
+        self.book.choices = book_choices()
+        self.translation.choices = translation_choices()
+
+
+class TextSearchForm(FlaskForm):
+    """Form to search the text of ingested translations."""
+
+    class Meta:
+        # read-only GET form
+        csrf = False
+
+    q = StringField("Words or phrase", validators=[DataRequired(), Length(max=200)])
+    translation = SelectField("Bible Translation", validators=[DataRequired()])
+    book = SelectField("Book", validators=[Optional()])
+    search = SubmitField("Search Text")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # only ingested translations can be searched
+        ingested = store.translations()
+        self.translation.choices = [
+            choice for choice in translation_choices() if choice[0] in ingested
+        ] or [(t, t) for t in sorted(ingested)]
+        self.book.choices = [("", "All books")] + book_choices()
+
+
+class ReferenceSearchForm(FlaskForm):
+    """Form to look up passages by reference, e.g. "Jn 3:16-18; Rom 8"."""
+
+    class Meta:
+        # read-only GET form
+        csrf = False
+
+    q = StringField("References", validators=[DataRequired(), Length(max=1000)])
+    translation = SelectField("Bible Translation", validators=[DataRequired()])
+    search = SubmitField("Find Passages")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.translation.choices = translation_choices()
+
+
+class ImportFavoritesForm(FlaskForm):
+    """Form to upload a CSV or JSON file of favorites."""
+
+    file = FileField(
+        "Favorites file",
+        validators=[
+            FileRequired(),
+            FileAllowed(["csv", "json", "jsonl"], "CSV or JSON files only"),
+        ],
+    )
     translation = SelectField(
-        "Bible Translation", choices=TRANSLATIONS_TUPLES, validators=[DataRequired()]
+        "Translation for rows without one", validators=[DataRequired()]
     )
-    search = SubmitField("Find Verse")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.translation.choices = translation_choices()
 
 
 class AddUserForm(FlaskForm):
@@ -0,0 +1,100 @@
+"""Cache of rendered verse HTML, keyed by passage.
+
+The favorite, search, reference search and tag pages all render the same
+verse markup for a passage. Templates call fragment(name, passage, ...)
+instead, which renders templates/fragments/<name>.html once per
+(name, translation, book, chapter, start, end) and serves the Markup from a
+byte bounded LRU after that. Passage text never changes, so entries only
+leave the cache when it's full.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from markupsafe import Markup
+
+MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+class FragmentCache:
+    """Thread safe LRU of rendered fragments, bounded by total size"""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+
+            if html is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        # characters rather than bytes, close enough for verse markup
+        size = len(html)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+
+            self._entries[key] = html
+            self.size += size
+
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+def fragment(name, passage, **context):
+    """
+    Markup for templates/fragments/<name>.html. passage is the
+    [translation, book, chapter, start, end] the context was built from;
+    the context is only used on a miss.
+    """
+    key = (name, *passage)
+    html = fragment_cache.get(key)
+
+    if html is None:
+        template = current_app.jinja_env.get_template(f"fragments/{name}.html")
+        html = Markup(template.render(**context))
+        fragment_cache.set(key, html)
+
+    return html
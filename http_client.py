@@ -0,0 +1,232 @@
+"""Shared HTTP client for bolls.life.
+
+One pooled requests.Session per process with connect/read timeouts, bounded
+retries with jittered exponential backoff and a circuit breaker that fails
+fast while upstream is unhealthy.
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import timed
+
+CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("UPSTREAM_READ_TIMEOUT", 10))
+RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 2))
+POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", 20))
+
+# Responses worth retrying, anything else is returned to the caller
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling upstream while the breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    closed: requests flow, consecutive failures are counted
+    open: requests fail fast until reset_timeout has passed
+    half_open: one trial request decides whether to close or re-open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class HttpClient:
+    """Pooled, timeout bounded GET requests against one upstream"""
+
+    def __init__(
+        self,
+        base_url,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries=RETRIES,
+        backoff=0.25,
+        pool_size=POOL_SIZE,
+        breaker=None,
+    ):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+
+    @property
+    def session(self):
+        """One session per process, gunicorn forks after import"""
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size,
+                        pool_maxsize=self.pool_size,
+                        max_retries=0,
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+
+        return self._session
+
+    def _sleep_before_retry(self, attempt):
+        # full jitter so retrying workers don't hit upstream in lockstep
+        time.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+    def get(self, path):
+        """
+        Returns the response for base_url + path.
+        Raises a RequestException once retries are exhausted or while the
+        circuit breaker is open.
+        """
+        with timed("upstream"):
+            return self._get(path)
+
+    def _get(self, path):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Upstream circuit open, skipped {path}")
+
+        url = f"{self.base_url}{path}"
+        error = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                self._sleep_before_retry(attempt - 1)
+
+            self.requests += 1
+
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+                continue
+            except requests.exceptions.RequestException:
+                # not worth retrying, but it still has to end a half open trial
+                self.failures += 1
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in RETRY_STATUSES:
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} from {url}", response=response
+                )
+                continue
+
+            if response.status_code >= 500:
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+            return response
+
+        self.failures += 1
+        self.breaker.record_failure()
+        raise error
+
+    def get_json(self, path):
+        response = self.get(path)
+        response.raise_for_status()
+        return response.json()
+
+    def pool_stats(self):
+        """Connections and requests per host pool of this process"""
+        pools = []
+
+        if self._session is not None:
+            for adapter in {id(a): a for a in self._session.adapters.values()}.values():
+                container = adapter.poolmanager.pools
+                for key in container.keys():
+                    pool = container[key]
+                    pools.append(
+                        {
+                            "host": pool.host,
+                            "connections_opened": pool.num_connections,
+                            "requests": pool.num_requests,
+                            "idle_connections": pool.pool.qsize() if pool.pool else 0,
+                        }
+                    )
+
+        return pools
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+            "requests": self.requests,
+            "retries": self.retried,
+            "failures": self.failures,
+            "pool_size": self.pool_size,
+            "pools": self.pool_stats(),
+            "breaker": self.breaker.stats(),
+        }
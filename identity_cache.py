@@ -0,0 +1,94 @@
+"""Per process cache of the signed in user's navbar fields.
+
+add_user_to_g runs before every request, including redirects and 404s,
+and most pages only need the user's id, names and profile image. Those are
+kept here for IDENTITY_CACHE_TTL seconds so a request doesn't need a round
+trip to the database. The full User row is loaded only when a route reads
+something else, e.g. g.user.tags, or asks for g.user.row.
+
+UserService.update_user, delete_user and logout drop the entry in this
+process; other workers pick up the change once their entry expires. A user
+deleted in another worker raises StaleIdentity as soon as their row is
+needed, and is signed out.
+"""
+
+import os
+
+from chapter_cache import LRUCache
+from models import db, User
+
+TTL = int(os.environ.get("IDENTITY_CACHE_TTL", 30))
+MAX_ENTRIES = int(os.environ.get("IDENTITY_CACHE_SIZE", 4096))
+
+# never the password hash
+FIELDS = ("id", "username", "first_name", "last_name", "img_url", "profile_img_url")
+
+
+class StaleIdentity(Exception):
+    """The signed in user's row was deleted, e.g. by another worker"""
+
+
+class CurrentUser:
+    """
+    Stands in for the signed in User: snapshot fields are read directly,
+    any other attribute loads the row once per request
+    """
+
+    __slots__ = FIELDS + ("_row", "_cache")
+
+    def __init__(self, snapshot, row=None, cache=None):
+        for name, value in zip(FIELDS, snapshot):
+            setattr(self, name, value)
+        self._row = row
+        self._cache = cache
+
+    @property
+    def row(self):
+        """
+        The User row, for routes that edit or delete it.
+        Raises StaleIdentity when the user no longer exists.
+        """
+        if self._row is None:
+            self._row = db.session.get(User, self.id)
+
+            if self._row is None:
+                if self._cache is not None:
+                    self._cache.forget(self.id)
+                raise StaleIdentity(f"user {self.id} no longer exists")
+
+        return self._row
+
+    def __getattr__(self, name):
+        # only reached for attributes that aren't in the snapshot
+        return getattr(self.row, name)
+
+    def __repr__(self):
+        return f"<CurrentUser id={self.id} username={self.username}>"
+
+
+class IdentityCache:
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.entries = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def get(self, user_id):
+        """A CurrentUser for user_id, or None if there's no such user"""
+        snapshot = self.entries.get(user_id)
+        if snapshot is not None:
+            return CurrentUser(snapshot, cache=self)
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+
+        snapshot = tuple(getattr(user, name) for name in FIELDS)
+        self.entries.set(user_id, snapshot)
+        return CurrentUser(snapshot, user, self)
+
+    def forget(self, user_id):
+        self.entries.delete(user_id)
+
+    def stats(self):
+        return self.entries.stats()
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,316 @@
+"""Per-request timing breakdown and Prometheus metrics.
+
+Each request gets a RequestTimings that database statements, upstream
+calls, chapter cache lookups, service methods and template renders add
+their time to. The totals go out in a Server-Timing header and feed the
+histograms served on /metrics in the Prometheus text format.
+
+Streamed pages send their headers before the body renders, so their
+Server-Timing covers the work done up to the first byte; the histograms are
+updated once the body has gone out and include the rest. Metrics are kept
+per process.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar, copy_context
+
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PHASES = ("db", "upstream", "service", "template")
+
+# seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Seconds and call counts per phase for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.service_depth = 0
+        self.templates = []
+        # chapters load on the fetch pool's threads too
+        self.lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self.lock:
+            self.seconds[phase] += seconds
+            self.calls[phase] += 1
+
+    def header(self):
+        """The Server-Timing value, durations in milliseconds"""
+        parts = []
+        for phase in PHASES:
+            if self.calls[phase]:
+                parts.append(
+                    f'{phase};dur={self.seconds[phase] * 1000:.1f};'
+                    f'desc="calls={self.calls[phase]}"'
+                )
+        if self.cache_hits or self.cache_misses:
+            parts.append(
+                f'chapter-cache;desc="hits={self.cache_hits} misses={self.cache_misses}"'
+            )
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def current():
+    """The running request's RequestTimings, None outside a request"""
+    return _current.get()
+
+
+def record(phase, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+class timed:
+    """with timed("upstream"): ... adds the block's time to the request"""
+
+    __slots__ = ("phase", "started")
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.phase, time.perf_counter() - self.started)
+
+
+def cache_lookup(hit):
+    """Counts a chapter cache hit or miss for the request and /metrics"""
+    cache_lookups.inc("hit" if hit else "miss")
+    timings = _current.get()
+    if timings is not None:
+        with timings.lock:
+            if hit:
+                timings.cache_hits += 1
+            else:
+                timings.cache_misses += 1
+
+
+def propagate(fn):
+    """fn bound to the caller's context, for work handed to a thread pool"""
+    return functools.partial(copy_context().run, fn)
+
+
+def instrumented(cls):
+    """
+    Class decorator timing every public method as the "service" phase,
+    also per method on /metrics. Calls from one service method into another
+    are only counted once.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(method):
+            continue
+        # a generator's work happens after it returns
+        if inspect.isgeneratorfunction(method):
+            continue
+        setattr(cls, name, _timed_method(f"{cls.__name__}.{name}", method))
+    return cls
+
+
+def _timed_method(label, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None or timings.service_depth:
+            return method(*args, **kwargs)
+
+        timings.service_depth += 1
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            timings.service_depth -= 1
+            timings.add("service", elapsed)
+            service_duration.observe(elapsed, label)
+
+    return wrapper
+
+
+##############################################################################
+# Prometheus metrics
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # bucket counts, sum, count
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    label_str = _labels(self.labelnames + ("le",), labels + (bound,))
+                    lines.append(f"{self.name}_bucket{label_str} {bucket_count}")
+                label_str = _labels(self.labelnames + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{label_str} {count}")
+                label_str = _labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_str} {total}")
+                lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from the start of a request until its body has been sent",
+    ("method", "route", "status"),
+)
+phase_duration = Histogram(
+    "http_request_phase_seconds",
+    "Time a request spent in each phase",
+    ("route", "phase"),
+)
+service_duration = Histogram(
+    "service_call_duration_seconds",
+    "Time spent in service layer methods",
+    ("function",),
+)
+cache_lookups = Counter(
+    "chapter_cache_lookups_total",
+    "Chapter cache lookups by result",
+    ("result",),
+)
+
+METRICS = [request_duration, phase_duration, service_duration, cache_lookups]
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+##############################################################################
+# Hooks
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if started:
+        record("db", time.perf_counter() - started.pop())
+
+
+def _template_started(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None:
+        timings.templates.append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None and timings.templates:
+        timings.add("template", time.perf_counter() - timings.templates.pop())
+
+
+def init_app(app):
+    """
+    Starts a RequestTimings for every request. Register before the app's
+    own before_request handlers so their queries are counted too.
+    """
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def start_timings():
+        _current.set(RequestTimings())
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+
+        response.headers["Server-Timing"] = timings.header()
+
+        method = request.method
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        status = str(response.status_code)
+
+        def observe():
+            request_duration.observe(
+                time.perf_counter() - timings.started, method, route, status
+            )
+            for phase in PHASES:
+                if timings.calls[phase]:
+                    phase_duration.observe(timings.seconds[phase], route, phase)
+
+        response.call_on_close(observe)
+        return response
+
+    @app.teardown_request
+    def stop_timings(exc):
+        _current.set(None)
@@ -0,0 +1,393 @@
+"""Load test for a gunicorn deployment of Scripture Sanctuary.
+
+Starts the bolls.life stand-in with the given latency and error rate,
+seeds a scratch database, runs `gunicorn app:app` against both and then
+drives it with a realistic mix of anonymous searches, logged in profile
+views, tag browsing and favorite creation. Concurrency ramps up stage by
+stage, with the simulated users spread over several client processes so
+the driver isn't the bottleneck:
+
+    python loadtest.py --workers 4 --threads 4 --stages 4 8 16 32 64
+    python loadtest.py --stub-latency 0.2 --stub-error-rate 0.05
+
+Each stage reports throughput and, per route, p50/p95/p99 latency and the
+error rate. The report ends with where throughput stopped growing, i.e.
+where gunicorn's workers * threads were all busy and requests started to
+queue. Results go to --output as JSON.
+
+Never point --db at a database you care about, its tables are dropped.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from stub_bolls import StubBolls, load_catalog
+
+# scenario: weight
+MIX = {"search": 5, "profile": 2, "tags": 2, "favorite": 1}
+
+SEED_SIZE = 1_000
+PASSWORD = "password"
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# a stage saturates when it adds less than this share of throughput
+SATURATION_GAIN = 0.10
+
+
+class VirtualUser:
+    """One browser session working through scenarios"""
+
+    def __init__(self, base_url, rng, user_id, books, record):
+        self.base_url = base_url
+        self.books = books
+        self.rng = rng
+        self.user_id = user_id
+        self.record = record
+        self.session = requests.Session()
+        self.csrf_token = None
+        self.logged_in = False
+
+    def request(self, route, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(
+                method, self.base_url + path, allow_redirects=False, timeout=30, **kwargs
+            )
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            resp, ok = None, False
+
+        self.record(route, (time.perf_counter() - start) * 1000, ok)
+        return resp
+
+    def token(self, route, path):
+        """The session's CSRF token, read from a form page once"""
+        if self.csrf_token is None:
+            resp = self.request(route, "GET", path)
+            match = CSRF_TOKEN.search(resp.text) if resp is not None else None
+            self.csrf_token = match[1] if match else ""
+        return self.csrf_token
+
+    def login(self):
+        if not self.logged_in:
+            self.request(
+                "POST /login",
+                "POST",
+                "/login",
+                data={
+                    "csrf_token": self.token("GET /login", "/login"),
+                    "username": f"user{self.user_id}",
+                    "password": PASSWORD,
+                },
+            )
+            self.logged_in = True
+
+    def search(self):
+        book = self.rng.choice(self.books)
+        start = self.rng.randint(1, 20)
+        self.request(
+            "POST /search",
+            "POST",
+            "/search",
+            data={
+                "csrf_token": self.token("GET /search", "/search"),
+                "book": str(book["bookid"]),
+                "chapter": self.rng.randint(1, book["chapters"]),
+                "start_verse": start,
+                "end_verse": start + self.rng.randint(0, 5),
+                "translation": "KJV",
+            },
+        )
+
+    def profile(self):
+        self.login()
+        self.request("GET /users/<id>", "GET", f"/users/{self.user_id}")
+
+    def tags(self):
+        self.request("GET /tags", "GET", "/tags")
+        self.request("GET /tags/<id>", "GET", f"/tags/{self.rng.randint(1, 3)}")
+
+    def favorite(self):
+        self.login()
+        # the search puts the passage in the session for /favorites/new
+        self.search()
+        self.request("POST /favorites/new", "POST", "/favorites/new")
+
+
+def run_clients(base_url, users, duration, seed, user_ids):
+    """
+    Runs users virtual users on threads for duration seconds.
+    Returns [(route, milliseconds, ok), ...]
+    """
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    scenarios, weights = zip(*MIX.items())
+    books, _ = load_catalog()
+
+    def record(route, ms, ok):
+        with lock:
+            samples.append((route, ms, ok))
+
+    def work(n):
+        rng = random.Random(seed * 1000 + n)
+        user = VirtualUser(base_url, rng, rng.choice(user_ids), books, record)
+        while time.monotonic() < deadline:
+            getattr(user, rng.choices(scenarios, weights)[0])()
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return samples
+
+
+def percentiles(timings):
+    if len(timings) < 2:
+        value = round(timings[0], 2) if timings else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+    }
+
+
+def summarize(samples, concurrency, elapsed):
+    routes = {}
+    for route, ms, ok in samples:
+        routes.setdefault(route, []).append((ms, ok))
+
+    def stats(entries):
+        errors = sum(1 for _, ok in entries if not ok)
+        return {
+            "requests": len(entries),
+            "rps": round(len(entries) / elapsed, 1),
+            "error_rate": round(errors / len(entries), 4) if entries else 0,
+            **percentiles([ms for ms, _ in entries]),
+        }
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 1),
+        **stats([(ms, ok) for _, ms, ok in samples]),
+        "routes": {route: stats(entries) for route, entries in sorted(routes.items())},
+    }
+
+
+def find_saturation(stages):
+    """The first stage that added less than SATURATION_GAIN throughput"""
+    for before, after in zip(stages, stages[1:]):
+        if after["rps"] < before["rps"] * (1 + SATURATION_GAIN):
+            return {
+                "concurrency": after["concurrency"],
+                "rps": after["rps"],
+                "last_scaling_concurrency": before["concurrency"],
+                "p99_ms_before": before["p99_ms"],
+                "p99_ms_after": after["p99_ms"],
+            }
+    return None
+
+
+def seed_database(workdir, db_uri, rounds):
+    """Seeds the scratch database the way bench_routes does, returns user ids"""
+    os.environ.update(
+        SUPABASE_DB_URI=db_uri,
+        CHAPTER_CACHE_DIR=os.path.join(workdir, "seed_cache"),
+        SCRIPTURE_STORE_PATH=os.path.join(workdir, "store.sqlite3"),
+        METADATA_SNAPSHOT_PATH=os.path.join(workdir, "metadata.json"),
+    )
+
+    from app import app
+    from bench_routes import USERS, seed
+    from models import db, User, Favorite, Tag, FavoriteTag
+    from password_hasher import hash_password
+
+    books, _ = load_catalog()
+    with app.app_context():
+        seed(
+            db,
+            (User, Favorite, Tag, FavoriteTag),
+            SEED_SIZE,
+            books,
+            hash_password(PASSWORD, rounds),
+        )
+        db.session.remove()
+        db.engine.dispose()
+
+    return list(range(1, USERS + 1))
+
+
+def start_server(args, env):
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "app:app",
+        "--workers",
+        str(args.workers),
+        "--threads",
+        str(args.threads),
+        "--bind",
+        f"127.0.0.1:{args.port}",
+        "--log-level",
+        "warning",
+    ]
+    server = subprocess.Popen(command, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            if requests.get(base_url + "/search", timeout=2).ok:
+                return server, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+
+    server.terminate()
+    raise RuntimeError("gunicorn did not start within 60 seconds")
+
+
+def run_stage(base_url, concurrency, args, user_ids, stage):
+    """Spreads concurrency users over the client processes"""
+    processes = min(args.clients, concurrency)
+    shares = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+
+    start = time.monotonic()
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        results = pool.starmap(
+            run_clients,
+            [
+                (base_url, users, args.duration, stage * 100 + i, user_ids)
+                for i, users in enumerate(shares)
+            ],
+        )
+    elapsed = time.monotonic() - start
+
+    return summarize([s for samples in results for s in samples], concurrency, elapsed)
+
+
+def print_stage(stage):
+    print(
+        f"c={stage['concurrency']:<4} {stage['rps']:8.1f} req/s  "
+        f"p50 {stage['p50_ms']:8.1f}  p95 {stage['p95_ms']:8.1f}  "
+        f"p99 {stage['p99_ms']:8.1f} ms  errors {stage['error_rate']:.2%}"
+    )
+    for route, r in stage["routes"].items():
+        print(
+            f"    {route:22} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:8.1f}  "
+            f"p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  "
+            f"errors {r['error_rate']:.2%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="scratch database, a temporary SQLite file by default")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--stages", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=15, help="seconds per stage")
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--output", default="loadtest.json")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    db_uri = args.db or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    stub = StubBolls(latency=args.stub_latency, error_rate=args.stub_error_rate)
+    server = None
+
+    try:
+        env = dict(
+            os.environ,
+            BOLLS_BASE_URL=stub.start(),
+            BCRYPT_LOG_ROUNDS=str(args.bcrypt_rounds),
+        )
+        os.environ["BOLLS_BASE_URL"] = env["BOLLS_BASE_URL"]
+
+        print(f"Seeding {SEED_SIZE} favorites...")
+        user_ids = seed_database(workdir, db_uri, args.bcrypt_rounds)
+
+        env.update(
+            SUPABASE_DB_URI=db_uri,
+            CHAPTER_CACHE_DIR=os.path.join(workdir, "chapter_cache"),
+            SCRIPTURE_STORE_PATH=os.path.join(workdir, "store.sqlite3"),
+            METADATA_SNAPSHOT_PATH=os.path.join(workdir, "metadata.json"),
+        )
+        server, base_url = start_server(args, env)
+        print(
+            f"gunicorn app:app on {base_url}: {args.workers} workers x "
+            f"{args.threads} threads, upstream latency {args.stub_latency}s, "
+            f"error rate {args.stub_error_rate:.0%}"
+        )
+
+        stages = []
+        for n, concurrency in enumerate(args.stages):
+            stage = run_stage(base_url, concurrency, args, user_ids, n)
+            stage["upstream"] = requests.get(base_url + "/status/upstream", timeout=5).json()
+            stages.append(stage)
+            print_stage(stage)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    saturation = find_saturation(stages)
+    capacity = args.workers * args.threads
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "workers": args.workers,
+        "threads": args.threads,
+        "capacity": capacity,
+        "duration": args.duration,
+        "stub_latency": args.stub_latency,
+        "stub_error_rate": args.stub_error_rate,
+        "mix": MIX,
+        "stages": stages,
+        "saturation": saturation,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if saturation:
+        print(
+            f"\nThroughput stopped scaling at {saturation['concurrency']} concurrent "
+            f"users (~{saturation['rps']} req/s, p99 {saturation['p99_ms_before']} -> "
+            f"{saturation['p99_ms_after']} ms); the server runs {capacity} requests "
+            "at a time"
+        )
+    else:
+        print(f"\nThroughput still grew at {args.stages[-1]} concurrent users")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
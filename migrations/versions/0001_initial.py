@@ -0,0 +1,71 @@
+"""initial schema
+
+Revision ID: 0001_initial
+Revises: 
+Create Date: 2024-08-20 12:00:00.000000
+
+Databases created with db.create_all() before migrations existed already
+have these tables; mark them with `flask db stamp 0001_initial`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("username", sa.String(length=500), nullable=False),
+        sa.Column("password", sa.String(length=500), nullable=False),
+        sa.Column("first_name", sa.String(length=500), nullable=True),
+        sa.Column("last_name", sa.String(length=500), nullable=True),
+        sa.Column("email", sa.String(length=500), nullable=False),
+        sa.Column("img_url", sa.String(length=500), nullable=True),
+        sa.Column("profile_img_url", sa.String(length=500), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("username"),
+    )
+    op.create_table(
+        "favorites",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("book", sa.Integer(), nullable=False),
+        sa.Column("chapter", sa.Integer(), nullable=False),
+        sa.Column("start", sa.Integer(), nullable=True),
+        sa.Column("end", sa.Integer(), nullable=True),
+        sa.Column("translation", sa.String(length=25), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="cascade"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "tags",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("name", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="cascade"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "favorite_tags",
+        sa.Column("favorite_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["favorite_id"], ["favorites.id"], ondelete="cascade"),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"], ondelete="cascade"),
+        sa.PrimaryKeyConstraint("favorite_id", "tag_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("favorite_tags")
+    op.drop_table("tags")
+    op.drop_table("favorites")
+    op.drop_table("users")
@@ -0,0 +1,45 @@
+"""add foreign key and lookup indexes
+
+Revision ID: 0002_lookup_indexes
+Revises: 0001_initial
+Create Date: 2024-08-20 12:30:00.000000
+
+Indexes are built CONCURRENTLY on PostgreSQL so existing tables stay
+writable while they are created.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_lookup_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_favorites_user_id_created_at", "favorites", ["user_id", "created_at"]),
+    ("ix_favorite_tags_tag_id", "favorite_tags", ["tag_id"]),
+    ("ix_tags_user_id", "tags", ["user_id"]),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
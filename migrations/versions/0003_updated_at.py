@@ -0,0 +1,38 @@
+"""add updated_at to favorites and tags
+
+Revision ID: 0003_updated_at
+Revises: 0002_lookup_indexes
+Create Date: 2024-09-02 10:00:00.000000
+
+Existing rows start out at the time of the migration.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003_updated_at"
+down_revision = "0002_lookup_indexes"
+branch_labels = None
+depends_on = None
+
+TABLES = ["favorites", "tags"]
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column(
+                    "updated_at",
+                    sa.TIMESTAMP(),
+                    nullable=False,
+                    server_default=sa.func.now(),
+                )
+            )
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("updated_at")
@@ -2,12 +2,12 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from flask_bcrypt import Bcrypt
 
 from sqlalchemy import PrimaryKeyConstraint
 
+from password_hasher import password_hasher, PasswordHasherBusy
+
 db = SQLAlchemy()
-bcrypt = Bcrypt()
 
 
 def connect_db(app):
@@ -46,9 +46,8 @@ class User(db.Model):
     def register(cls, username, pwd, email, first_name, last_name, img_url, profile_img_url):
         """Register user w/hashed password & return user."""
 
-        hashed = bcrypt.generate_password_hash(pwd)
-        # turn bytestring into normal (unicode utf8) string
-        hashed_utf8 = hashed.decode("utf8")
+        # hashed off the request thread, may raise PasswordHasherBusy
+        hashed_utf8 = password_hasher.hash(pwd)
 
         # return instance of user w/username and hashed pwd
         return cls(username=username, password=hashed_utf8, email=email, first_name=first_name, last_name=last_name, img_url=img_url, profile_img_url=profile_img_url)
@@ -62,7 +61,16 @@ class User(db.Model):
 
         u = User.query.filter_by(username=username).first()
 
-        if u and bcrypt.check_password_hash(u.password, pwd):
+        if u and password_hasher.verify(u.password, pwd):
+            # upgrade hashes made with a different work factor
+            if password_hasher.needs_rehash(u.password):
+                try:
+                    u.password = password_hasher.hash(pwd)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    # the old hash still works, try again next login
+                    pass
+
             # return user instance
             return u
         else:
@@ -81,11 +89,21 @@ class Favorite(db.Model):
     end = db.Column(db.Integer)
     translation = db.Column(db.String(25), nullable=False)
 
-    created_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.now())
+    created_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.now)
+    # bumped whenever the favorite page would render differently, e.g. its
+    # tags change; feeds the page's ETag and Last-Modified
+    updated_at = db.Column(
+        db.TIMESTAMP, nullable=False, default=datetime.now, onupdate=datetime.now
+    )
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"))
 
     tags = db.relationship("Tag", secondary="favorite_tags", backref="favorites")
 
+    # profile pages list a user's favorites newest first
+    __table_args__ = (
+        db.Index("ix_favorites_user_id_created_at", "user_id", "created_at"),
+    )
+
     def __repr__(self):
         favorite = self
         return f"<Favorite id={favorite.id} book={favorite.book} chapter={favorite.chapter} start={favorite.start} end={favorite.end} translation={favorite.translation} created_at={favorite.created_at} user={favorite.users.username}>"
@@ -97,8 +115,14 @@ class Tag(db.Model):
     __tablename__ = "tags"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"))
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="cascade"), index=True
+    )
     name = db.Column(db.Text, unique=True)
+    # bumped on renames and when favorites join or leave the tag
+    updated_at = db.Column(
+        db.TIMESTAMP, nullable=False, default=datetime.now, onupdate=datetime.now
+    )
 
     def __repr__(self):
         tag = self
@@ -115,7 +139,11 @@ class FavoriteTag(db.Model):
     )
     tag_id = db.Column(db.Integer, db.ForeignKey("tags.id", ondelete="cascade"))
 
-    __table_args__ = (PrimaryKeyConstraint("favorite_id", "tag_id"),)
+    # the primary key covers lookups by favorite_id, tag pages need tag_id
+    __table_args__ = (
+        PrimaryKeyConstraint("favorite_id", "tag_id"),
+        db.Index("ix_favorite_tags_tag_id", "tag_id"),
+    )
 
     def __repr__(self):
         favorite_tag = self
@@ -0,0 +1,94 @@
+"""Keyset (cursor) pagination for list pages.
+
+Pages are read with `WHERE (sort columns) > (last row seen) ORDER BY ...
+LIMIT n` so the cost of a page doesn't grow with how deep into the list the
+reader is. The last column of every ordering must be unique (the id).
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+PAGE_SIZE = 50
+
+
+class Page:
+    """One page of rows plus the cursor for the following page"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    values = [
+        {"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values
+    ]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    """
+    Returns the cursor values, or None when it's missing, malformed or a
+    value isn't of the type of its column, e.g. (datetime, int)
+    """
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        values = [
+            datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v
+            for v in values
+        ]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+
+    if not isinstance(values, list) or len(values) != len(types):
+        return None
+
+    for value, type_ in zip(values, types):
+        # JSON true and false are ints to isinstance
+        if not isinstance(value, type_) or isinstance(value, bool):
+            return None
+
+    return values
+
+
+def paginate(query, columns, cursor=None, per_page=PAGE_SIZE, descending=False):
+    """
+    Returns a Page of query ordered by columns, starting after cursor.
+    query can select whole models or just the columns a page displays.
+    """
+    after = decode_cursor(cursor, [column.type.python_type for column in columns])
+
+    if after is not None:
+        key, last = tuple_(*columns), tuple_(*after)
+        query = query.filter(key < last if descending else key > last)
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(
+            [getattr(rows[-1], column.key) for column in columns]
+        )
+
+    return Page(rows, next_cursor)
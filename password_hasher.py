@@ -0,0 +1,150 @@
+"""Password hashing on a bounded process pool.
+
+bcrypt is deliberately slow, and on the request thread a burst of logins
+keeps every worker busy on CPU while page views wait. Hashes and checks run
+in a small process pool instead, with a cap on how many may be queued: once
+it's full new requests are turned away straight away with PasswordHasherBusy
+rather than piling up behind each other.
+
+The work factor comes from BCRYPT_LOG_ROUNDS. Hashes made with another cost
+are replaced the next time their owner logs in.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+# 0 hashes on the calling thread, still bounded by MAX_PENDING
+WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(2, os.cpu_count() or 1)))
+MAX_PENDING = int(os.environ.get("PASSWORD_HASH_QUEUE", 16))
+# seconds a request waits for its hash before giving up
+TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes are already queued, or one took too long"""
+
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode(
+        "utf-8"
+    )
+
+
+def check_password(hashed, password):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_rounds(hashed):
+    """The cost of a "$2b$12$..." hash, None if it isn't one"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(
+        self, rounds=ROUNDS, workers=WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def pool(self):
+        """
+        Started on first use in each process: a pool inherited over a gunicorn
+        fork has no management thread or workers of its own and is replaced
+        """
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # spawned children only import this module, never the app
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.count("rejected")
+            raise PasswordHasherBusy("password hashing queue is full")
+
+        self.count("pending")
+        started = time.perf_counter()
+
+        try:
+            if not self.workers:
+                result = fn(*args)
+            else:
+                future = self.pool().submit(fn, *args)
+                result = future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            self.count("rejected")
+            raise PasswordHasherBusy("password hashing timed out")
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None
+            self.count("rejected")
+            raise PasswordHasherBusy("password hashing pool stopped")
+        finally:
+            self.count("pending", -1)
+            self._slots.release()
+
+        self.count("completed")
+        self.count("seconds", time.perf_counter() - started)
+        return result
+
+    def count(self, name, amount=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def hash(self, password):
+        """A bcrypt hash of password at the configured cost"""
+        return self.run(hash_password, password, self.rounds)
+
+    def verify(self, hashed, password):
+        return self.run(check_password, hashed, password)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            # the parent's pool is the parent's to shut down
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.seconds / self.completed * 1000, 1)
+            if self.completed
+            else None,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,107 @@
+"""Counts the SQL statements an engine executes.
+
+Also the test suite's query budgets: a block can declare how many
+statements it may issue, and statements that only differ in their
+parameters repeated inside it are reported as N+1 queries.
+"""
+
+import re
+from collections import Counter
+
+from sqlalchemy import event
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+# expanding IN parameters in SQLAlchemy's compiled form
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+
+
+def shape(statement):
+    """
+    statement with literals, parameters and IN lists replaced by ?, so the
+    same query run for different rows has the same shape
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _POSTCOMPILE.sub("(?)", statement)
+    statement = _STRING.sub("?", statement)
+    statement = _PARAM.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _IN_LIST.sub("(?)", statement)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block issued more statements than its budget, or an N+1 query"""
+
+
+class QueryCounter:
+    """
+    Records every statement executed on engine while active:
+
+        with QueryCounter(db.engine) as queries:
+            client.get("/users/1")
+        queries.count
+
+    With a budget the block fails once it's over that many statements, and
+    with max_repeats once any one shape ran more often than that:
+
+        with QueryCounter(db.engine, budget=4, max_repeats=1):
+            client.get("/users/1")
+    """
+
+    def __init__(self, engine, budget=None, max_repeats=None):
+        self.engine = engine
+        self.budget = budget
+        self.max_repeats = max_repeats
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+        # an error inside the block is the more useful one to report
+        if exc_type is None:
+            self.check()
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def shapes(self):
+        """Counter of statement shapes, most run first"""
+        return Counter(shape(statement) for statement in self.statements)
+
+    def repeated(self, max_repeats=1):
+        """{shape: times run} for shapes run more than max_repeats times"""
+        return {
+            statement: times
+            for statement, times in self.shapes().most_common()
+            if times > max_repeats
+        }
+
+    def check(self):
+        """Raises QueryBudgetExceeded when the budget or max_repeats is broken"""
+        problems = []
+
+        if self.budget is not None and self.count > self.budget:
+            problems.append(f"{self.count} statements, budget is {self.budget}")
+
+        if self.max_repeats is not None:
+            for statement, times in self.repeated(self.max_repeats).items():
+                problems.append(f"N+1: ran {times} times: {statement}")
+
+        if problems:
+            raise QueryBudgetExceeded("\n".join(problems + ["Statements:", self.report()]))
+
+    def report(self):
+        return "\n".join(
+            f"{times:4}x {statement}" for statement, times in self.shapes().most_common()
+        )
@@ -0,0 +1,296 @@
+"""Free-text scripture references, e.g. "Jn 3:16-18; Rom 8; 1 Cor 13:4-7".
+
+Book names are matched with a character trie built from the metadata book
+catalog plus common abbreviations, so a book costs one dict lookup per
+character. References resolve to the [translation, book, chapter, start, end]
+criteria that get_scripture takes.
+"""
+
+import re
+import threading
+
+from bible_metadata import metadata
+
+# Abbreviations that aren't unique prefixes of a book name, by bookid
+ABBREVIATIONS = {
+    1: ["gn"],
+    2: ["ex"],
+    3: ["lv"],
+    4: ["nm", "nb"],
+    5: ["dt"],
+    6: ["jos", "jsh"],
+    7: ["jdg", "jg", "jdgs"],
+    8: ["rth", "ru"],
+    9: ["1sm", "1sa"],
+    10: ["2sm", "2sa"],
+    11: ["1kgs", "1ki", "1kg"],
+    12: ["2kgs", "2ki", "2kg"],
+    13: ["1chr", "1ch"],
+    14: ["2chr", "2ch"],
+    16: ["ne"],
+    17: ["est", "es"],
+    18: ["jb"],
+    19: ["ps", "psa", "psalm", "pss", "psm"],
+    20: ["prv", "pr"],
+    21: ["eccl", "ecc", "qoh"],
+    22: ["song", "sos", "songofsongs", "canticles", "sg"],
+    23: ["is"],
+    24: ["jer", "jr"],
+    25: ["lam", "la"],
+    26: ["ezek", "ezk"],
+    27: ["dan", "dn"],
+    28: ["hos", "ho"],
+    29: ["jl"],
+    30: ["am"],
+    31: ["obad", "ob"],
+    32: ["jnh", "jon"],
+    33: ["mic", "mc"],
+    34: ["nah", "na"],
+    35: ["hab", "hb"],
+    36: ["zeph", "zep", "zp"],
+    37: ["hag", "hg"],
+    38: ["zech", "zec", "zc"],
+    39: ["mal", "ml"],
+    40: ["mt", "matt"],
+    41: ["mk", "mrk", "mr"],
+    42: ["lk", "luk"],
+    43: ["jn", "jhn", "joh"],
+    44: ["ac"],
+    45: ["rm", "ro"],
+    46: ["1co"],
+    47: ["2co"],
+    48: ["ga"],
+    49: ["eph"],
+    50: ["phil", "php", "pp"],
+    51: ["col"],
+    52: ["1th", "1thess", "1thes"],
+    53: ["2th", "2thess", "2thes"],
+    54: ["1tm", "1ti"],
+    55: ["2tm", "2ti"],
+    56: ["tit"],
+    57: ["phlm", "phm", "philem"],
+    58: ["heb"],
+    59: ["jas", "jm"],
+    60: ["1pt", "1pe", "1pet"],
+    61: ["2pt", "2pe", "2pet"],
+    62: ["1jn", "1jhn", "1jo"],
+    63: ["2jn", "2jhn", "2jo"],
+    64: ["3jn", "3jhn", "3jo"],
+    65: ["jud", "jd"],
+    66: ["rev", "rv", "apocalypse"],
+}
+
+# Shortest prefix of a full book name accepted on its own
+MIN_PREFIX = 3
+
+ROMAN = {"1": "i", "2": "ii", "3": "iii"}
+
+# Characters skipped while matching a book name: "1 Cor." == "1cor"
+SKIP = frozenset(" .\t")
+
+BOOK = ""
+
+NUMBERS = re.compile(
+    r"[\s.]*(\d+)(?:\s*:\s*(\d+))?(?:\s*[-–—]\s*(?:(\d+)\s*:\s*)?(\d+))?\s*$"
+)
+GROUPS = re.compile(r"[;\n]")
+
+
+def normalize(name):
+    return "".join(ch for ch in name.lower() if ch not in SKIP)
+
+
+def build_trie(books, abbreviations=ABBREVIATIONS):
+    """
+    Returns a trie of lowercase names without spaces or dots. Nodes are dicts
+    of character -> node, and a node that ends a name maps BOOK to its bookid.
+    Full names, unique prefixes of them and abbreviations are all included,
+    with "I Cor" style numbering for numbered books.
+    """
+    names = {}
+    prefixes = {}
+
+    for book in books:
+        bookid = book["bookid"]
+        name = normalize(book["name"])
+        names[name] = bookid
+
+        for end in range(MIN_PREFIX, len(name)):
+            prefixes.setdefault(name[:end], set()).add(bookid)
+
+    for prefix, bookids in prefixes.items():
+        if len(bookids) == 1 and prefix not in names:
+            names[prefix] = next(iter(bookids))
+
+    known = {book["bookid"] for book in books}
+    for bookid, aliases in abbreviations.items():
+        if bookid in known:
+            for alias in aliases:
+                names[alias] = bookid
+
+    for name, bookid in list(names.items()):
+        if name[0] in ROMAN:
+            names.setdefault(ROMAN[name[0]] + name[1:], bookid)
+
+    root = {}
+    for name, bookid in names.items():
+        node = root
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node[BOOK] = bookid
+
+    return root
+
+
+def match_book(trie, text):
+    """match_book() for text that is already lower case"""
+    node = trie
+    match = None, 0
+
+    for i, ch in enumerate(text):
+        if ch in SKIP:
+            continue
+
+        node = node.get(ch)
+        if node is None:
+            break
+
+        if BOOK in node:
+            match = node[BOOK], i + 1
+
+    return match
+
+
+class ReferenceParser:
+    """Parses references against the current metadata book catalog"""
+
+    def __init__(self, registry=metadata):
+        self.registry = registry
+        self._books = None
+        self._trie = None
+        self._chapters = {}
+        self._lock = threading.Lock()
+
+    def trie(self):
+        """Rebuilt whenever the metadata registry refreshes its catalog"""
+        books = self.registry.books()
+
+        if books is not self._books:
+            with self._lock:
+                if books is not self._books:
+                    self._trie = build_trie(books)
+                    self._chapters = {b["bookid"]: b["chapters"] for b in books}
+                    self._books = books
+
+        return self._trie
+
+    def match_book(self, text):
+        """
+        Returns (bookid, end) for the longest book name at the start of text,
+        or (None, 0) if there isn't one
+        """
+        return match_book(self.trie(), text.lower())
+
+    def parse(self, text, translation="KJV"):
+        """
+        Returns (criteria, unmatched) for references separated by ";" or new
+        lines. A reference without a book continues the one before it, and
+        after a comma a bare number is another verse of the same chapter:
+        "Jn 3:16, 18; 4:1" is John 3:16, 3:18 and 4:1.
+        criteria: [[translation, book, chapter, start, end], ...]
+        unmatched: the pieces that aren't references
+        """
+        return self._parse(self.trie(), text, translation)
+
+    def _parse(self, trie, text, translation):
+        chapters = self._chapters
+        criteria = []
+        unmatched = []
+        book = chapter = None
+
+        for group in GROUPS.split(text):
+            for i, piece in enumerate(group.split(",")):
+                if not piece or piece.isspace():
+                    continue
+
+                lowered = piece.lower()
+                bookid, end = match_book(trie, lowered)
+                numbers = NUMBERS.match(lowered, end)
+
+                if numbers is None or (bookid is None and book is None):
+                    unmatched.append(piece.strip())
+                    continue
+
+                first, verse, end_chapter, last = numbers.groups()
+                first = int(first)
+
+                if bookid is not None:
+                    book, chapter = bookid, None
+                elif i and verse is None and end_chapter is None and chapter:
+                    verse, first = first, chapter
+
+                count = chapters.get(book, 0)
+
+                if count == 1 and verse is None:
+                    # "Jude 3" is a verse of the only chapter
+                    first, verse = 1, first
+                    if last is not None and end_chapter is None:
+                        end_chapter = 1
+
+                refs = self._expand(
+                    translation,
+                    book,
+                    first,
+                    int(verse) if verse else None,
+                    int(end_chapter) if end_chapter else None,
+                    int(last) if last else None,
+                    count,
+                )
+
+                if refs is None:
+                    unmatched.append(piece.strip())
+                    continue
+
+                criteria.extend(refs)
+                chapter = first if verse is not None else None
+
+        return criteria, unmatched
+
+    def _expand(self, translation, book, chapter, verse, end_chapter, last, count):
+        """Criteria for one reference, None if it can't be served"""
+        if chapter < 1 or chapter > count:
+            return None
+
+        if verse is None:
+            # "Rom 8" or the chapter range "Rom 8-9"
+            last_chapter = last if last is not None else chapter
+            if last_chapter < chapter or last_chapter > count:
+                return None
+            return [
+                [translation, book, c, None, None]
+                for c in range(chapter, last_chapter + 1)
+            ]
+
+        if end_chapter is not None and end_chapter != chapter:
+            # a verse range across chapters doesn't fit one criteria
+            return None
+
+        if verse < 1 or (last is not None and last < verse):
+            return None
+
+        if last == verse:
+            last = None
+
+        return [[translation, book, chapter, verse, last]]
+
+    def parse_many(self, texts, translation="KJV"):
+        """parse() for a batch of texts, e.g. the lines of imported notes"""
+        trie = self.trie()
+        return [self._parse(trie, text, translation) for text in texts]
+
+
+parser = ReferenceParser()
+
+
+def parse_references(text, translation="KJV"):
+    return parser.parse(text, translation)
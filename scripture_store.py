@@ -0,0 +1,214 @@
+"""Local store of ingested bible translations.
+
+Verses live in a SQLite file next to the app so every gunicorn worker can
+read them without going through bolls.life or the Postgres user database.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from strongs import parse_verse
+
+STORE_PATH = os.environ.get(
+    "SCRIPTURE_STORE_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "instance",
+        "scripture_store.sqlite3",
+    ),
+)
+
+# How often a worker re-reads the list of ingested translations, so that
+# an ingest run in another process is picked up without a restart
+TRANSLATIONS_TTL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verses (
+    translation TEXT NOT NULL,
+    book INTEGER NOT NULL,
+    chapter INTEGER NOT NULL,
+    verse INTEGER NOT NULL,
+    pk INTEGER,
+    text TEXT NOT NULL,
+    strongs TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (translation, book, chapter, verse)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS translations (
+    short_name TEXT PRIMARY KEY,
+    verse_count INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+"""
+
+
+class ScriptureStore:
+    """Read/write access to the local verse table"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._translations = None
+        self._translations_loaded_at = 0
+
+    def _connect(self):
+        """Returns a connection owned by the current thread and process"""
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+
+        return conn
+
+    def _migrate(self, conn):
+        """Splits Strong's numbers out of verses ingested before the column existed"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(verses)")}
+
+        if "strongs" in columns:
+            return
+
+        with conn:
+            conn.execute("ALTER TABLE verses ADD COLUMN strongs TEXT NOT NULL DEFAULT ''")
+            rows = conn.execute(
+                "SELECT translation, book, chapter, verse, text FROM verses "
+                "WHERE text LIKE '%<S>%'"
+            ).fetchall()
+            updates = []
+            for translation, book, chapter, verse, text in rows:
+                text, refs = parse_verse(text, book)
+                updates.append((text, " ".join(refs), translation, book, chapter, verse))
+            conn.executemany(
+                "UPDATE verses SET text = ?, strongs = ? WHERE translation = ? "
+                "AND book = ? AND chapter = ? AND verse = ?",
+                updates,
+            )
+
+    def translations(self):
+        """
+        Returns the translations that have been ingested:
+        {short_name: ingested_at}
+        """
+        now = time.monotonic()
+
+        if (
+            self._translations is None
+            or now - self._translations_loaded_at > TRANSLATIONS_TTL
+        ):
+            rows = self._connect().execute(
+                "SELECT short_name, ingested_at FROM translations"
+            )
+            self._translations = dict(rows.fetchall())
+            self._translations_loaded_at = now
+
+        return self._translations
+
+    def has_translation(self, translation):
+        return translation in self.translations()
+
+    def get_chapter(self, translation, book, chapter):
+        """
+        Returns the verses of a chapter in the same shape as bolls.life:
+        [{"pk", "verse", "text"}]
+        None if the translation or chapter is not in the store.
+        """
+        if not self.has_translation(translation):
+            return None
+
+        rows = self._connect().execute(
+            "SELECT pk, verse, text FROM verses "
+            "WHERE translation = ? AND book = ? AND chapter = ? ORDER BY verse",
+            (translation, book, chapter),
+        ).fetchall()
+
+        if not rows:
+            return None
+
+        return [{"pk": pk, "verse": verse, "text": text} for pk, verse, text in rows]
+
+    def iter_verses(self, translation):
+        """Yields (book, chapter, verse, text) for a whole translation in order"""
+        yield from self._connect().execute(
+            "SELECT book, chapter, verse, text FROM verses "
+            "WHERE translation = ? ORDER BY book, chapter, verse",
+            (translation,),
+        )
+
+    def iter_strongs(self, translation):
+        """
+        Yields (book, chapter, verse, text, ["G26", ...]) for the verses of a
+        translation that carry Strong's numbers
+        """
+        rows = self._connect().execute(
+            "SELECT book, chapter, verse, text, strongs FROM verses "
+            "WHERE translation = ? AND strongs != '' ORDER BY book, chapter, verse",
+            (translation,),
+        )
+        for book, chapter, verse, text, refs in rows:
+            yield book, chapter, verse, text, refs.split()
+
+    def ingest(self, translation, verses):
+        """
+        Replaces a translation with the given verses in one transaction.
+        Strong's numbers are split out of the text as verses are stored.
+        verses: iterable of {"book", "chapter", "verse", "text", "pk"?}
+        Returns the number of verses stored.
+        """
+        conn = self._connect()
+
+        def rows():
+            for v in verses:
+                text, refs = parse_verse(v["text"], v["book"])
+                yield (
+                    translation,
+                    int(v["book"]),
+                    int(v["chapter"]),
+                    int(v["verse"]),
+                    v.get("pk"),
+                    text,
+                    " ".join(refs),
+                )
+
+        with conn:
+            conn.execute("DELETE FROM verses WHERE translation = ?", (translation,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO verses "
+                "(translation, book, chapter, verse, pk, text, strongs) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows(),
+            )
+            count = conn.execute(
+                "SELECT COUNT(*) FROM verses WHERE translation = ?", (translation,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO translations "
+                "(short_name, verse_count, ingested_at) VALUES (?, ?, ?)",
+                (translation, count, time.time()),
+            )
+
+        self._translations = None
+        return count
+
+
+def read_dump(path, translation):
+    """
+    Yields verses from a downloaded bolls.life translation dump, a JSON
+    list of {"pk", "translation", "book", "chapter", "verse", "text"}
+    """
+    with open(path, encoding="utf-8") as f:
+        verses = json.load(f)
+
+    for verse in verses:
+        if verse.get("translation", translation) == translation:
+            yield verse
+
+
+store = ScriptureStore()
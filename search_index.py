@@ -0,0 +1,261 @@
+"""Full-text verse search over translations in the local scripture store.
+
+Each ingested translation gets an in-process inverted index: term -> sorted
+array of verse ids with a parallel array of term frequencies. Queries support
+"quoted phrases", AND (the default), OR, NOT / -term, and are ranked with
+BM25. An index is rebuilt only when its own translation is re-ingested.
+"""
+
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+
+from scripture_store import store
+from store_indexes import StoreIndexes
+
+MARKUP = re.compile(r"<S>\d+</S>|<[^>]+>")
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+QUERY_TOKEN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    return TOKEN.findall(MARKUP.sub(" ", text).lower())
+
+
+def parse_query(query):
+    """
+    Returns OR-ed clauses, each a list of (negated, terms) items where more
+    than one term means a phrase:
+    'love "is patient" -hate OR charity' ->
+    [[(False, ["love"]), (False, ["is", "patient"]), (True, ["hate"])],
+     [(False, ["charity"])]]
+    """
+    clauses = [[]]
+    negate_next = False
+
+    for match in QUERY_TOKEN.finditer(query):
+        minus, phrase, word = match.groups()
+
+        if word in ("OR", "|"):
+            clauses.append([])
+            continue
+        if word == "AND":
+            continue
+        if word == "NOT":
+            negate_next = True
+            continue
+
+        negated = negate_next or bool(minus)
+        if word is not None and word.startswith("-") and len(word) > 1:
+            negated, word = True, word[1:]
+
+        terms = tokenize(phrase if phrase is not None else word)
+        if terms:
+            clauses[-1].append((negated, terms))
+        negate_next = False
+
+    return [clause for clause in clauses if clause]
+
+
+class TranslationIndex:
+    """Inverted index over one translation"""
+
+    def __init__(self, translation, version):
+        self.translation = translation
+        self.version = version
+        self.books = array("B")
+        self.chapters = array("H")
+        self.verses = array("H")
+        self.lengths = array("H")
+        self.texts = []
+        # " term term ... " per verse, phrases are matched as substrings
+        self.normalized = []
+        self.postings = {}
+        self.average_length = 0
+
+    @classmethod
+    def build(cls, translation, version, rows):
+        """rows: (book, chapter, verse, text) in reading order"""
+        index = cls(translation, version)
+        doc_ids = {}
+        frequencies = {}
+
+        for doc_id, (book, chapter, verse, text) in enumerate(rows):
+            terms = tokenize(text)
+            index.books.append(book)
+            index.chapters.append(chapter)
+            index.verses.append(verse)
+            index.lengths.append(min(len(terms), 65535))
+            index.texts.append(text)
+            index.normalized.append(f" {' '.join(terms)} ")
+
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+
+            for term, count in counts.items():
+                if term not in doc_ids:
+                    doc_ids[term] = array("I")
+                    frequencies[term] = array("H")
+                doc_ids[term].append(doc_id)
+                frequencies[term].append(min(count, 65535))
+
+        index.postings = {
+            term: (doc_ids[term], frequencies[term]) for term in doc_ids
+        }
+        if index.lengths:
+            index.average_length = sum(index.lengths) / len(index.lengths)
+        return index
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _docs(self, terms, book):
+        """Verse ids containing every term, and the terms in sequence for phrases"""
+        postings = []
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                return set()
+            postings.append(posting[0])
+
+        postings.sort(key=len)
+        docs = set(postings[0])
+        for posting in postings[1:]:
+            docs.intersection_update(posting)
+            if not docs:
+                return docs
+
+        if book:
+            docs = {doc for doc in docs if self.books[doc] == book}
+
+        if len(terms) > 1:
+            phrase = f" {' '.join(terms)} "
+            docs = {doc for doc in docs if phrase in self.normalized[doc]}
+
+        return docs
+
+    def match(self, clauses, book=None):
+        """Verse ids matching any clause"""
+        matches = set()
+
+        for clause in clauses:
+            positives = [terms for negated, terms in clause if not negated]
+            if not positives:
+                continue
+
+            docs = self._docs(positives[0], book)
+            for terms in positives[1:]:
+                if not docs:
+                    break
+                docs &= self._docs(terms, book)
+
+            for negated, terms in clause:
+                if negated and docs:
+                    docs -= self._docs(terms, book)
+
+            matches |= docs
+
+        return matches
+
+    def scores(self, docs, terms):
+        """BM25 scores of the given verses for the query terms: {doc: score}"""
+        count = len(self.texts)
+        average = self.average_length or 1
+        scores = dict.fromkeys(docs, 0.0)
+
+        for term in terms:
+            doc_ids, frequencies = self.postings.get(term, ((), ()))
+            if not doc_ids:
+                continue
+
+            df = len(doc_ids)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+            if df <= len(scores):
+                pairs = (
+                    (doc, tf) for doc, tf in zip(doc_ids, frequencies) if doc in scores
+                )
+            else:
+                pairs = []
+                for doc in scores:
+                    i = bisect_left(doc_ids, doc)
+                    if i < df and doc_ids[i] == doc:
+                        pairs.append((doc, frequencies[i]))
+
+            for doc, tf in pairs:
+                norm = K1 * (1 - B + B * self.lengths[doc] / average)
+                scores[doc] += idf * tf * (K1 + 1) / (tf + norm)
+
+        return scores
+
+    def result(self, doc, score):
+        return {
+            "translation": self.translation,
+            "book": self.books[doc],
+            "chapter": self.chapters[doc],
+            "verse": self.verses[doc],
+            "text": self.texts[doc],
+            "score": round(score, 4),
+        }
+
+
+class SearchEngine(StoreIndexes):
+    """Builds and queries one TranslationIndex per ingested translation"""
+
+    def __init__(self, store=store):
+        super().__init__(store)
+
+    def build(self, translation, version):
+        return TranslationIndex.build(
+            translation, version, self.store.iter_verses(translation)
+        )
+
+    def search(self, query, translation, book=None, page=1, per_page=20):
+        """
+        Returns ranked verses for a query:
+        {"total", "page", "pages", "results": [{"translation", "book",
+        "chapter", "verse", "text", "score"}]}
+        """
+        empty = {"total": 0, "page": page, "pages": 0, "results": []}
+        index = self.index(translation)
+        clauses = parse_query(query)
+
+        if index is None or not clauses:
+            return empty
+
+        matches = index.match(clauses, book)
+        terms = {
+            term
+            for clause in clauses
+            for negated, item in clause
+            if not negated
+            for term in item
+        }
+
+        page = max(page, 1)
+        scores = index.scores(matches, terms)
+        # ties keep reading order
+        top = heapq.nlargest(
+            page * per_page, ((score, -doc) for doc, score in scores.items())
+        )
+        results = [
+            index.result(-neg_doc, score)
+            for score, neg_doc in top[(page - 1) * per_page :]
+        ]
+
+        return {
+            "total": len(matches),
+            "page": page,
+            "pages": math.ceil(len(matches) / per_page),
+            "results": results,
+        }
+
+
+search_engine = SearchEngine()
@@ -1,14 +1,44 @@
-from models import db, Favorite
-from api_requests import get_books, get_scripture
-import re
+from datetime import datetime
 
-BOOKS = get_books()
+from models import db, Favorite, FavoriteTag
+from pagination import paginate
+from api_requests import select_verses
+from bible_metadata import metadata
+from instrumentation import instrumented
 
 
+@instrumented
 class FavoriteService:
     def get_fav_by_id(self, favorite_id):
         return Favorite.query.get_or_404(favorite_id)
 
+    def favorite_columns(self):
+        """Columns needed to title and look up a favorite's passage"""
+        return db.session.query(
+            Favorite.id,
+            Favorite.book,
+            Favorite.chapter,
+            Favorite.start,
+            Favorite.end,
+            Favorite.translation,
+            Favorite.created_at,
+            Favorite.updated_at,
+        )
+
+    def get_user_favorites_page(self, user_id, cursor=None):
+        """A page of a user's favorites, newest first"""
+        query = self.favorite_columns().filter(Favorite.user_id == user_id)
+        return paginate(
+            query, [Favorite.created_at, Favorite.id], cursor, descending=True
+        )
+
+    def get_tag_favorites_page(self, tag_id, cursor=None):
+        """A page of the favorites in a tag"""
+        query = self.favorite_columns().join(
+            FavoriteTag, FavoriteTag.favorite_id == Favorite.id
+        ).filter(FavoriteTag.tag_id == tag_id)
+        return paginate(query, [Favorite.id], cursor)
+
     def format_scripture(self, scripture):
         """
         input: scripture obj
@@ -41,7 +71,7 @@ class FavoriteService:
         for scripture in query:
             id = scripture.id
             scripture = {
-                "book": BOOKS[scripture.book - 1]["name"],
+                "book": metadata.book_name(scripture.book),
                 "chapter": scripture.chapter,
                 "start": scripture.start,
                 "end": scripture.end,
@@ -64,19 +94,6 @@ class FavoriteService:
         ]
         return criteria
 
-    def remove_strongs_tags(self, text):
-        """
-        Remove <S> tags and their content from the given text.
-        """
-        return re.sub(r"<S>\d+</S>", "", text)
-
-    def format_verses(self, text):
-        formatted_verses = []
-        for verse in text:
-            formatted_text = self.remove_strongs_tags(verse["text"])
-            formatted_verses.append({"verse": verse["verse"], "text": formatted_text})
-        return formatted_verses
-
     def create_new_fav(self, criteria, user):
         favorite = Favorite(
             user_id=user.id,
@@ -92,26 +109,45 @@ class FavoriteService:
         return favorite
 
     def delete_fav(self, fav):
+        # the favorite drops off its tags' pages
+        now = datetime.now()
+        for tag in fav.tags:
+            tag.updated_at = now
+
         db.session.delete(fav)
         db.session.commit()
 
-    def get_scriptures(self, tag):
-        scriptures = []
+    def get_chapter_keys(self, favorites):
+        """(translation, book, chapter) of each favorite"""
+        return [
+            (favorite.translation, favorite.book, favorite.chapter)
+            for favorite in favorites
+        ]
+
+    def iter_tag_scriptures(self, favorites, load_chapter):
+        """
+        Yields tag page entries one favorite at a time, getting each chapter
+        with load_chapter((translation, book, chapter)) only when it's reached
+        """
+        for favorite in favorites:
+            chapter = load_chapter(
+                (favorite.translation, favorite.book, favorite.chapter)
+            )
+
+            try:
+                text = select_verses(chapter, favorite.start, favorite.end)[0]
+            except (TypeError, IndexError):
+                # chapter could not be fetched or verse is out of range
+                continue
 
-        for favorite in tag.favorites:
-            criteria = self.get_favorite_criteria(favorite)
-            text = get_scripture(criteria)[0]
-            scripture_text = self.remove_strongs_tags(text["text"])
+            scripture_text = text.text
             scripture_title_id = self.format_favorite_query([favorite])[0]
             more = len(scripture_text) > 1
-            scriptures.append(
-                {
-                    "text": scripture_text,
-                    "title": scripture_title_id["title"],
-                    "id": scripture_title_id["id"],
-                    "more": more,
-                    "verse": text["verse"],
-                }
-            )
-            
-        return scriptures
+            yield {
+                "text": scripture_text,
+                "title": scripture_title_id["title"],
+                "id": scripture_title_id["id"],
+                "more": more,
+                "verse": text.verse,
+                "passage": self.get_favorite_criteria(favorite),
+            }
@@ -1,6 +1,7 @@
-from api_requests import get_books
-BOOKS = get_books()
+from bible_metadata import metadata
+from instrumentation import instrumented
 
+@instrumented
 class SearchService:
     def format_criteria(self, crit):
         formatted = {
@@ -12,9 +13,18 @@ class SearchService:
         }
         return formatted
     
+    def format_text_results(self, results):
+        """Adds a "John 3:16 (KJV)" style title to full-text search results"""
+        for result in results:
+            result["title"] = (
+                f"{metadata.book_name(result['book'])} "
+                f"{result['chapter']}:{result['verse']} ({result['translation']})"
+            )
+        return results
+
     def format_scripture(self, crit):
         formatted = {
-            "book": BOOKS[crit[1] - 1]["name"],
+            "book": metadata.book_name(crit[1]),
             "chapter": crit[2],
             "trans": crit[0],
             "start": crit[3],
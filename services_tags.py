@@ -1,10 +1,11 @@
-from models import db, Tag
-from api_requests import get_books
-
+from datetime import datetime
 
-BOOKS = get_books()
+from models import db, Tag
+from instrumentation import instrumented
+from pagination import paginate
 
 
+@instrumented
 class TagService:
     def get_tag_by_id(self, id):
         tag = Tag.query.get_or_404(id)
@@ -14,11 +15,30 @@ class TagService:
         tags = Tag.query.all()
         return tags
 
+    def get_tags_page(self, cursor=None):
+        """A page of tag ids and names"""
+        return paginate(db.session.query(Tag.id, Tag.name), [Tag.id], cursor)
+
+    def get_own_tags(self, user_id):
+        """Ids and names of the tags a user created"""
+        return (
+            db.session.query(Tag.id, Tag.name)
+            .filter(Tag.user_id == user_id)
+            .order_by(Tag.id)
+            .all()
+        )
+
     def save_favorite_tags(self, fav, selected):
-        fav.tags = []
-        for tag in selected:
-            tag = Tag.query.filter_by(name=tag).first()
-            fav.tags.append(tag)
+        before = set(fav.tags)
+        # one query for every selected tag, looking them up one at a time
+        # also flushed an insert per tag
+        fav.tags = Tag.query.filter(Tag.name.in_(selected)).all() if selected else []
+
+        # the favorite's page and the pages of tags it joined or left change
+        now = datetime.now()
+        fav.updated_at = now
+        for tag in before.symmetric_difference(fav.tags):
+            tag.updated_at = now
         db.session.commit()
 
     def save_new_tag(self, user, title):
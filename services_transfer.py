@@ -0,0 +1,334 @@
+"""Bulk import and export of a user's favorites with their tags.
+
+Both directions stream: export reads favorites a batch at a time and
+yields CSV or JSON text as it goes, import parses the uploaded file row by
+row and writes each batch with multi-row INSERTs, so memory stays flat
+however many favorites a file holds.
+"""
+
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, select, update
+
+from bible_metadata import metadata
+from instrumentation import instrumented
+from models import db, Favorite, FavoriteTag, Tag
+from reference_parser import parser as reference_parser
+
+BATCH_SIZE = 1000
+
+CSV_COLUMNS = [
+    "reference",
+    "translation",
+    "book",
+    "chapter",
+    "start",
+    "end",
+    "created_at",
+    "tags",
+]
+
+# tags share one CSV column: "hope|love"
+TAG_SEPARATOR = "|"
+
+# row errors reported back to the user
+MAX_ERRORS = 20
+
+JSON_GAP = re.compile(r"[\s,]*")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def iter_csv(stream):
+    """Yields the rows of an uploaded CSV file as dicts"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    yield from csv.DictReader(text)
+
+
+def iter_json(stream, chunk_size=64 * 1024):
+    """
+    Yields the objects of an uploaded JSON array, or of JSON lines, reading
+    the file a chunk at a time
+    """
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    buffer = ""
+    pos = 0
+    eof = False
+
+    while True:
+        pos = JSON_GAP.match(buffer, pos).end()
+
+        if buffer.startswith("[", pos):
+            pos += 1
+            continue
+        if buffer.startswith("]", pos):
+            return
+
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                if pos < len(buffer):
+                    raise ValueError("The file isn't a JSON list of favorites")
+                return
+
+            chunk = text.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        if not isinstance(item, dict):
+            raise ValueError("The file isn't a JSON list of favorites")
+        yield item
+
+
+@instrumented
+class TransferService:
+    def format_reference(self, book_name, chapter, start, end):
+        """ "John 3:16-18" """
+        reference = f"{book_name} {chapter}"
+
+        if start and end:
+            reference += f":{start}-{end}"
+        elif start:
+            reference += f":{start}"
+        elif end:
+            reference += f":1-{end}"
+
+        return reference
+
+    def get_tag_names(self, connection, favorite_ids):
+        """{favorite_id: [tag name, ...]} for a batch of favorites"""
+        rows = connection.execute(
+            select(FavoriteTag.favorite_id, Tag.name)
+            .join(Tag, Tag.id == FavoriteTag.tag_id)
+            .where(FavoriteTag.favorite_id.in_(favorite_ids))
+            .order_by(Tag.name)
+        )
+
+        tags = {}
+        for favorite_id, name in rows:
+            tags.setdefault(favorite_id, []).append(name)
+        return tags
+
+    def iter_export_batches(self, user_id):
+        """
+        Yields lists of export records for a user's favorites, oldest first,
+        with one query for the tags of each batch
+        """
+        book_names = {book["bookid"]: book["name"] for book in metadata.books()}
+        connection = db.session.connection()
+        result = connection.execute(
+            select(
+                Favorite.id,
+                Favorite.translation,
+                Favorite.book,
+                Favorite.chapter,
+                Favorite.start,
+                Favorite.end,
+                Favorite.created_at,
+            )
+            .where(Favorite.user_id == user_id)
+            .order_by(Favorite.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+
+        for rows in result.partitions():
+            tags = self.get_tag_names(connection, [row[0] for row in rows])
+            yield [
+                {
+                    "reference": self.format_reference(
+                        book_names.get(book) or f"Book {book}", chapter, start, end
+                    ),
+                    "translation": translation,
+                    "book": book,
+                    "chapter": chapter,
+                    "start": start,
+                    "end": end,
+                    "created_at": created_at.isoformat(),
+                    "tags": tags.get(id, []),
+                }
+                for id, translation, book, chapter, start, end, created_at in rows
+            ]
+
+    def export_csv(self, user_id):
+        """Yields a user's favorites as CSV text, one chunk per batch"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_COLUMNS)
+        writer.writeheader()
+
+        for records in self.iter_export_batches(user_id):
+            for record in records:
+                writer.writerow({**record, "tags": TAG_SEPARATOR.join(record["tags"])})
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def export_json(self, user_id):
+        """Yields a user's favorites as a JSON list, one chunk per batch"""
+        yield "["
+        separator = "\n"
+
+        for records in self.iter_export_batches(user_id):
+            chunk = ",\n".join(json.dumps(record) for record in records)
+            yield separator + chunk
+            separator = ",\n"
+
+        yield "\n]\n"
+
+    def parse_rows(self, user_id, rows, translation, summary):
+        """
+        Yields (favorite values, [tag names]) for imported rows. A row has
+        either book, chapter, start and end columns or a reference such as
+        "Jn 3:16-18". Rows that can't be used are counted in summary.
+        """
+        now = datetime.now()
+
+        for line, row in enumerate(rows, 1):
+            try:
+                for values in self.parse_row(user_id, row, translation, now):
+                    yield values, self.parse_tags(row.get("tags"))
+            except (ValueError, TypeError) as e:
+                summary["skipped"] += 1
+                if len(summary["errors"]) < MAX_ERRORS:
+                    summary["errors"].append(f"Row {line}: {e}")
+
+    def parse_row(self, user_id, row, default_translation, now):
+        """Favorite values for one imported row, several for a chapter range"""
+        translation = str(row.get("translation") or default_translation).strip()
+        if not translation or len(translation) > 25:
+            raise ValueError(f"invalid translation {translation!r}")
+
+        created_at = row.get("created_at")
+        created_at = datetime.fromisoformat(created_at) if created_at else now
+
+        if row.get("book") not in (None, "") and row.get("chapter") not in (None, ""):
+            criteria = [
+                [
+                    translation,
+                    int(row["book"]),
+                    int(row["chapter"]),
+                    int(row["start"]) if row.get("start") not in (None, "") else None,
+                    int(row["end"]) if row.get("end") not in (None, "") else None,
+                ]
+            ]
+        elif row.get("reference"):
+            criteria, unmatched = reference_parser.parse(row["reference"], translation)
+            if unmatched or not criteria:
+                raise ValueError(f"unrecognized reference {row['reference']!r}")
+        else:
+            raise ValueError("needs a reference or book and chapter")
+
+        values = []
+        for translation, book, chapter, start, end in criteria:
+            info = metadata.book(book)
+            if info is None or not 1 <= chapter <= info["chapters"]:
+                raise ValueError(f"no such chapter: book {book} chapter {chapter}")
+            if any(verse is not None and verse < 1 for verse in (start, end)):
+                raise ValueError(f"invalid verses {start}-{end}")
+            if start is not None and end is not None and start > end:
+                raise ValueError(f"start verse {start} is after end verse {end}")
+
+            values.append(
+                {
+                    "user_id": user_id,
+                    "translation": translation,
+                    "book": book,
+                    "chapter": chapter,
+                    "start": start,
+                    "end": end,
+                    "created_at": created_at,
+                }
+            )
+
+        return values
+
+    def parse_tags(self, tags):
+        """Tag names from a JSON list or a "hope|love" CSV column"""
+        if not tags:
+            return []
+        if isinstance(tags, str):
+            tags = tags.split(TAG_SEPARATOR)
+
+        return list(dict.fromkeys(str(tag).strip() for tag in tags if str(tag).strip()))
+
+    def import_favorites(self, user_id, rows, translation="KJV"):
+        """
+        Adds favorites from parsed file rows in one transaction, BATCH_SIZE
+        rows per INSERT. Tags are matched by name and created in bulk.
+        Returns {"imported", "skipped", "tags_created", "errors"}.
+        """
+        summary = {"imported": 0, "skipped": 0, "tags_created": 0, "errors": []}
+        tag_ids = {}
+
+        try:
+            parsed = self.parse_rows(user_id, rows, translation, summary)
+            for batch in batched(parsed, BATCH_SIZE):
+                self.insert_batch(user_id, batch, tag_ids, summary)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return summary
+
+    def insert_batch(self, user_id, batch, tag_ids, summary):
+        """
+        Writes a batch with Core multi-row INSERTs on the session's
+        connection, bypassing the ORM unit of work
+        """
+        connection = db.session.connection()
+        names = {name for _, tags in batch for name in tags} - tag_ids.keys()
+
+        if names:
+            existing = connection.execute(
+                select(Tag.name, Tag.id).where(Tag.name.in_(names))
+            )
+            tag_ids.update(existing.all())
+            missing = sorted(names - tag_ids.keys())
+
+            if missing:
+                created = connection.execute(
+                    insert(Tag.__table__).returning(Tag.name, Tag.id),
+                    [{"name": name, "user_id": user_id} for name in missing],
+                )
+                tag_ids.update(created.all())
+                summary["tags_created"] += len(missing)
+
+        favorite_ids = connection.execute(
+            insert(Favorite.__table__).returning(
+                Favorite.id, sort_by_parameter_order=True
+            ),
+            [values for values, _ in batch],
+        ).scalars().all()
+
+        links = [
+            {"favorite_id": favorite_id, "tag_id": tag_ids[name]}
+            for favorite_id, (_, tags) in zip(favorite_ids, batch)
+            for name in tags
+        ]
+        if links:
+            connection.execute(insert(FavoriteTag.__table__), links)
+            connection.execute(
+                update(Tag.__table__)
+                .where(Tag.id.in_({link["tag_id"] for link in links}))
+                .values(updated_at=datetime.now())
+            )
+
+        summary["imported"] += len(favorite_ids)
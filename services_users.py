@@ -1,19 +1,43 @@
-from models import db, User
-from flask_bcrypt import Bcrypt
-
-bcrypt = Bcrypt()
+from models import db, User, Favorite, Tag, FavoriteTag
+from sqlalchemy import select, union
+from pagination import paginate
+from identity_cache import identity_cache
+from password_hasher import password_hasher
+from instrumentation import instrumented
 
+@instrumented
 class UserService:
     def get_user_by_id(self, user_id):
         return User.query.get_or_404(user_id)
 
+    def get_users_page(self, cursor=None):
+        """A page of users with only the columns the users list shows"""
+        query = db.session.query(
+            User.id,
+            User.username,
+            User.first_name,
+            User.last_name,
+            User.profile_img_url,
+        )
+        return paginate(query, [User.id], cursor)
+
     def get_user_tags(self, user_id):
-        user = self.get_user_by_id(user_id)
-        if user:
-            return {tag for tag in user.tags} | {
-                tag for fav in user.favorites for tag in fav.tags
-            }
-        return set()
+        """
+        Tags created by the user or attached to one of their favorites,
+        loaded with a single UNION query
+        """
+        own_tags = select(Tag.id).where(Tag.user_id == user_id)
+        favorite_tags = (
+            select(FavoriteTag.tag_id)
+            .join(Favorite, Favorite.id == FavoriteTag.favorite_id)
+            .where(Favorite.user_id == user_id)
+        )
+
+        return (
+            Tag.query.filter(Tag.id.in_(union(own_tags, favorite_tags)))
+            .order_by(Tag.name)
+            .all()
+        )
 
     def update_user(self, user, data):
         user.username = data["username"]
@@ -24,11 +48,14 @@ class UserService:
         user.profile_img_url = data["profile_img_url"]
 
         if data.get("password"):
-            user.password = bcrypt.generate_password_hash(data["password"]).decode("utf-8")
+            user.password = password_hasher.hash(data["password"])
 
         db.session.commit()
+        identity_cache.forget(user.id)
         
     def delete_user(self, user_id):
+        id = user_id.id
         db.session.delete(user_id)
         db.session.commit()
+        identity_cache.forget(id)
         
@@ -0,0 +1,126 @@
+"""Request coalescing for identical in-flight upstream fetches.
+
+Threads asking for the same key while a fetch is running wait for that fetch
+and share its result. Across gunicorn workers an advisory lock file per key
+lets one process fetch while the others wait and then read the shared cache.
+"""
+
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+LOCK_DIR = os.environ.get(
+    "SINGLE_FLIGHT_LOCK_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "locks"),
+)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time in this process"""
+
+    def __init__(self, lock_dir=LOCK_DIR):
+        self.lock_dir = lock_dir
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.process_waits = 0
+        self.process_wait_seconds = 0.0
+
+    def do(self, key, fn):
+        """Returns fn(), or the result of the identical call already running"""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
+
+    def _lock_path(self, key):
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", "-".join(str(part) for part in key))
+        return os.path.join(self.lock_dir, f"{name}.lock")
+
+    @contextmanager
+    def process_lock(self, key):
+        """
+        Holds an exclusive lock file for key across processes.
+        Yields True when another process held it first, so the caller should
+        check the shared cache before fetching.
+        """
+        if fcntl is None:
+            yield False
+            return
+
+        try:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            yield False
+            return
+
+        waited = False
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                waited = True
+                start = time.perf_counter()
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                with self._lock:
+                    self.process_waits += 1
+                    self.process_wait_seconds += time.perf_counter() - start
+
+            yield waited
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "process_waits": self.process_waits,
+            "process_wait_seconds": round(self.process_wait_seconds, 3),
+        }
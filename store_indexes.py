@@ -0,0 +1,45 @@
+"""In-process indexes over the translations in the local scripture store.
+
+An index is built on first use and rebuilt once its translation has been
+re-ingested, which the store's ingested_at version tells apart. Concurrent
+first uses of one translation build it once, other translations don't wait.
+"""
+
+import threading
+
+
+class StoreIndexes:
+    """One index per ingested translation, subclasses say how to build it"""
+
+    def __init__(self, store):
+        self.store = store
+        self.indexes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def build(self, translation, version):
+        raise NotImplementedError
+
+    def index(self, translation):
+        """
+        Returns the index of a translation, building it on first use and
+        again whenever the translation has been re-ingested
+        """
+        version = self.store.translations().get(translation)
+        if version is None:
+            return None
+
+        index = self.indexes.get(translation)
+        if index is not None and index.version == version:
+            return index
+
+        with self._lock:
+            lock = self._locks.setdefault(translation, threading.Lock())
+
+        with lock:
+            index = self.indexes.get(translation)
+            if index is None or index.version != version:
+                index = self.build(translation, version)
+                self.indexes[translation] = index
+
+        return index
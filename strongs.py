@@ -0,0 +1,49 @@
+"""Strong's number parsing for verse text.
+
+bolls.life marks Strong's numbers inline, e.g. "God<S>2316</S> is love".
+Verses are parsed once, when they are ingested or cached, into clean text and
+a list of references so rendering never has to strip tags again.
+"""
+
+import re
+
+STRONGS_TAG = re.compile(r"<S>(\d+)</S>")
+
+# Old Testament books reference the Hebrew lexicon, the rest the Greek
+LAST_OT_BOOK = 39
+
+
+def lexicon(book):
+    return "H" if int(book) <= LAST_OT_BOOK else "G"
+
+
+def parse_verse(text, book):
+    """Returns (clean text, ["G26", ...]) for one verse"""
+    prefix = lexicon(book)
+    numbers = STRONGS_TAG.findall(text)
+
+    if not numbers:
+        return text, []
+
+    return STRONGS_TAG.sub("", text), [f"{prefix}{number}" for number in numbers]
+
+
+def clean_chapter(verses, book):
+    """Strips Strong's tags from a chapter in the bolls.life shape"""
+    cleaned = []
+
+    for verse in verses:
+        text, _ = parse_verse(verse["text"], book)
+        cleaned.append({**verse, "text": text})
+
+    return cleaned
+
+
+def normalize(number):
+    """ "g26", "G0026" and "G26" -> "G26", None if it isn't a Strong's number"""
+    match = re.fullmatch(r"([HGhg])0*(\d+)", number.strip())
+
+    if not match:
+        return None
+
+    return f"{match[1].upper()}{match[2]}"
@@ -0,0 +1,167 @@
+"""Local stand-in for the bolls.life endpoints the app uses.
+
+Serves the book catalog, the translation list and generated chapters so the
+app can be tested and measured without the real upstream:
+
+    python stub_bolls.py --port 8001 --latency 0.05
+    BOLLS_BASE_URL=http://127.0.0.1:8001 flask run
+
+--chapters serves recorded chapters instead where it has them, from a
+directory laid out like the chapter cache: <translation>/<book>/<chapter>.json
+(e.g. instance/chapter_cache/v2 after browsing against the real bolls.life).
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEED_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "metadata_seed.json"
+)
+
+CHAPTER_PATH = re.compile(r"^/get-chapter/([^/]+)/(\d+)/(\d+)/?$")
+
+
+def load_catalog():
+    with open(SEED_PATH, encoding="utf-8") as f:
+        seed = json.load(f)
+    return seed["books"], seed["translations"]
+
+
+def make_chapter(translation, book, chapter, verses=30):
+    """Generated verses in the bolls.life get-chapter shape"""
+    return [
+        {
+            "pk": book * 1_000_000 + chapter * 1000 + verse,
+            "verse": verse,
+            "text": f"{translation} {book}:{chapter}:{verse} In the beginning was the Word.",
+        }
+        for verse in range(1, verses + 1)
+    ]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes, without this every
+    # keep-alive response waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.count(self.path)
+
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        if stub.error_rate and random.random() < stub.error_rate:
+            return self.send_json(503, {"detail": "stub error"})
+
+        if self.path == "/static/bolls/app/views/translations_books.json":
+            return self.send_json(200, {"YLT": stub.books})
+
+        if self.path == "/static/bolls/app/views/languages.json":
+            return self.send_json(
+                200, [{"language": "English", "translations": stub.translations}]
+            )
+
+        match = CHAPTER_PATH.match(self.path)
+        if match:
+            translation, book, chapter = match[1], int(match[2]), int(match[3])
+            book_info = stub.books_by_id.get(book)
+
+            if book_info is None or not 1 <= chapter <= book_info["chapters"]:
+                return self.send_json(404, {"detail": "Not found"})
+
+            return self.send_json(200, stub.chapter(translation, book, chapter))
+
+        self.send_json(404, {"detail": "Not found"})
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubBolls:
+    """bolls.life stand-in running on a background thread"""
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, chapters_dir=None
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.chapters_dir = chapters_dir
+        self.books, self.translations = load_catalog()
+        self.books_by_id = {book["bookid"]: book for book in self.books}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def chapter(self, translation, book, chapter):
+        if self.chapters_dir:
+            path = os.path.join(
+                self.chapters_dir, translation, str(book), f"{chapter}.json"
+            )
+            try:
+                with open(path, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        return make_chapter(translation, book, chapter)
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self._server.server_port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503s")
+    parser.add_argument("--chapters", help="directory of recorded chapter JSON")
+    args = parser.parse_args()
+
+    stub = StubBolls(
+        args.host, args.port, args.latency, args.error_rate, args.chapters
+    )
+    print(f"Serving bolls.life stand-in on {stub.start()}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
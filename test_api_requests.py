@@ -0,0 +1,106 @@
+"""API request tests for Scripture Sanctuary."""
+
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import api_requests
+from app import app
+from chapter_cache import chapter_cache
+
+
+class GetChaptersTestCase(TestCase):
+    """Test concurrent, deduplicated chapter loading."""
+
+    def setUp(self):
+        chapter_cache.memory.clear()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def slow_get_chapter(self, translation, book, chapter):
+        with self.lock:
+            self.calls.append((translation, book, chapter))
+        time.sleep(0.2)
+        return [{"pk": 1, "verse": 1, "text": f"{book}:{chapter}"}]
+
+    def test_fetches_each_chapter_once(self):
+        """Do favorites sharing a chapter trigger a single fetch?"""
+        keys = [("NIV", 43, 3), ("NIV", 43, 3), ("NIV", "43", "3"), ("KJV", 19, 23)]
+
+        with patch.object(api_requests, "get_chapter", self.slow_get_chapter):
+            chapters = api_requests.get_chapters(keys)
+
+        self.assertEqual(sorted(self.calls), [("KJV", 19, 23), ("NIV", 43, 3)])
+        self.assertEqual(chapters[("NIV", 43, 3)][0]["text"], "43:3")
+
+    def test_fetches_concurrently(self):
+        """Does latency track the slowest chapter rather than the sum?"""
+        keys = [("NIV", 19, chapter) for chapter in range(1, 9)]
+
+        with patch.object(api_requests, "get_chapter", self.slow_get_chapter):
+            start = time.perf_counter()
+            chapters = api_requests.get_chapters(keys)
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(chapters), 8)
+        self.assertLess(elapsed, 0.2 * 8 / 2)
+
+    def test_get_scriptures(self):
+        """Are passages sliced from chapters loaded together?"""
+        def get_chapter(translation, book, chapter):
+            if chapter == 99:
+                return None
+            return [{"pk": v, "verse": v, "text": f"{chapter}:{v}"} for v in range(1, 6)]
+
+        criteria = [["KJV", "43", "3", 2, 3], ["KJV", 43, 99, 1, None], ["KJV", 19, 1, 4, None]]
+        with patch.object(api_requests, "get_chapter", get_chapter):
+            passages = api_requests.get_scriptures(criteria)
+
+        self.assertEqual([v["verse"] for v in passages[0]], [2, 3])
+        self.assertIsNone(passages[1])
+        self.assertEqual([v["text"] for v in passages[2]], ["1:4"])
+
+    def test_get_scriptures_out_of_range(self):
+        """Are verses past the end of a chapter not found, not an error?"""
+        def get_chapter(translation, book, chapter):
+            return [{"pk": v, "verse": v, "text": f"{chapter}:{v}"} for v in range(1, 6)]
+
+        criteria = [
+            ["KJV", 43, 3, 9, None],
+            ["KJV", 43, 3, 4, 8],
+            ["KJV", 43, 3, 5, None],
+        ]
+        with patch.object(api_requests, "get_chapter", get_chapter):
+            passages = api_requests.get_scriptures(criteria)
+
+        self.assertEqual(passages[:2], [None, None])
+        self.assertEqual([v["text"] for v in passages[2]], ["3:5"])
+
+
+class ReferenceSearchViewTestCase(TestCase):
+    """Test looking up typed references."""
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        chapter_cache.set(
+            ("NIV", 43, 3),
+            [{"pk": v, "verse": v, "text": f"John 3:{v}"} for v in range(1, 37)],
+            shared=False,
+        )
+
+    def tearDown(self):
+        chapter_cache.memory.delete(("NIV", 43, 3))
+
+    def test_verses_out_of_range(self):
+        """Do passages past the end of a chapter show as not found?"""
+        resp = app.test_client().get(
+            "/search/reference",
+            query_string={"q": "Jn 3:99; Jn 3:30-40; Jn 3:16", "translation": "NIV"},
+        )
+        html = resp.get_data(as_text=True)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(html.count("Sorry, scripture not found."), 2)
+        self.assertIn("John 3:16", html)
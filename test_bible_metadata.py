@@ -0,0 +1,65 @@
+"""Bible metadata registry tests for Scripture Sanctuary."""
+
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from bible_metadata import SEED_PATH, SNAPSHOT_VERSION, MetadataRegistry
+
+
+def failing_fetch():
+    raise ConnectionError("bolls.life is down")
+
+
+class MetadataRegistryTestCase(TestCase):
+    """Test the snapshot backed registry."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.tmpdir.name, "snapshot.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_starts_from_seed_when_upstream_down(self):
+        """Can the app boot from the seed while bolls.life is unreachable?"""
+        registry = MetadataRegistry(
+            self.snapshot_path, SEED_PATH, failing_fetch, failing_fetch
+        )
+
+        self.assertEqual(len(registry.books()), 66)
+        self.assertEqual(registry.book_name(43), "John")
+        self.assertFalse(registry.refresh())
+
+    def test_refresh_persists_snapshot(self):
+        """Is a refreshed catalog saved and used by the next process?"""
+        books = [{"bookid": 1, "name": "Genesis", "chronorder": 1, "chapters": 50}]
+        translations = [{"short_name": "YLT", "full_name": "Young's Literal"}]
+        registry = MetadataRegistry(
+            self.snapshot_path, SEED_PATH, lambda: books, lambda: translations
+        )
+
+        self.assertTrue(registry.refresh())
+
+        with open(self.snapshot_path) as f:
+            self.assertEqual(json.load(f)["version"], SNAPSHOT_VERSION)
+
+        restarted = MetadataRegistry(
+            self.snapshot_path, SEED_PATH, failing_fetch, failing_fetch
+        )
+        self.assertEqual(restarted.translations(), translations)
+        self.assertFalse(restarted.is_stale())
+
+    def test_ignores_other_snapshot_versions(self):
+        """Are snapshots written by another version ignored?"""
+        with open(self.snapshot_path, "w") as f:
+            json.dump(
+                {"version": 0, "fetched_at": time.time(), "books": [{"bookid": 1}]}, f
+            )
+
+        registry = MetadataRegistry(
+            self.snapshot_path, SEED_PATH, failing_fetch, failing_fetch
+        )
+        self.assertEqual(len(registry.books()), 66)
@@ -0,0 +1,87 @@
+"""Cache warming tests for Scripture Sanctuary."""
+
+import os
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from requests.exceptions import ConnectionError
+
+from cache_warmer import CacheWarmer, RateLimiter, translation_keys
+
+KEYS = [("KJV", 1, 1), ("KJV", 1, 2), ("KJV", 19, 23), ("KJV", 1, 999)]
+
+
+class CacheWarmerTestCase(TestCase):
+    """Test the summary, resuming and rate limiting."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.progress_path = os.path.join(self.dir.name, "warm.progress")
+        self.fetched = []
+        self.lock = threading.Lock()
+        self.upstream_down = True
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def fetch(self, translation, book, chapter):
+        with self.lock:
+            self.fetched.append((translation, book, chapter))
+        if chapter == 999:
+            return None
+        if book == 19 and self.upstream_down:
+            raise ConnectionError("upstream down")
+        return [{"verse": 1, "text": "..."}]
+
+    def warmer(self):
+        return CacheWarmer(self.progress_path, workers=2, rate=0, fetch=self.fetch)
+
+    def test_translation_keys(self):
+        """Is every chapter of every book listed?"""
+        books = [{"bookid": 1, "chapters": 2}, {"bookid": 65, "chapters": 1}]
+        self.assertEqual(
+            translation_keys("YLT", books),
+            [("YLT", 1, 1), ("YLT", 1, 2), ("YLT", 65, 1)],
+        )
+
+    @patch.object(CacheWarmer, "is_cached", lambda self, key: key == ("KJV", 1, 2))
+    def test_resumes_after_failures(self):
+        """Are failures retried on the next run and finished keys not?"""
+        summary = self.warmer().run(KEYS + [("KJV", 1, 1)])
+
+        self.assertEqual(summary["fetched"], 1)
+        self.assertEqual(summary["skipped"], 1)
+        self.assertEqual(
+            summary["failed"],
+            [(("KJV", 19, 23), "upstream down"), (("KJV", 1, 999), "not found upstream")],
+        )
+        self.assertTrue(os.path.exists(self.progress_path))
+
+        self.fetched = []
+        self.upstream_down = False
+        summary = self.warmer().run(KEYS[:3])
+
+        self.assertEqual(self.fetched, [("KJV", 19, 23)])
+        self.assertEqual(summary["fetched"], 1)
+        self.assertEqual(summary["skipped"], 2)
+        self.assertFalse(os.path.exists(self.progress_path))
+
+    def test_rate_limiter(self):
+        """Are calls spaced out by the rate?"""
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+
+        limiter = RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            limiter.wait()
+
+        self.assertEqual(sleeps, [0.25, 0.5])
+
+        now[0] = 200.0
+        limiter.wait()
+        self.assertEqual(len(sleeps), 2)
@@ -0,0 +1,97 @@
+"""Chapter cache tests for Scripture Sanctuary."""
+
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from chapter_cache import ChapterCache, DiskCache, LRUCache
+
+JOHN_3 = [{"pk": v, "verse": v, "text": f"verse {v}"} for v in range(1, 37)]
+
+
+class LRUCacheTestCase(TestCase):
+    """Test the in-process layer."""
+
+    def setUp(self):
+        self.now = 0
+        self.cache = LRUCache(max_entries=2, ttl=10, clock=lambda: self.now)
+
+    def test_evicts_least_recently_used(self):
+        """Is the least recently used chapter evicted first?"""
+        self.cache.set(("KJV", 43, 3), JOHN_3)
+        self.cache.set(("KJV", 19, 23), [])
+        self.cache.get(("KJV", 43, 3))
+        self.cache.set(("KJV", 1, 1), [])
+
+        self.assertIsNotNone(self.cache.get(("KJV", 43, 3)))
+        self.assertIsNone(self.cache.get(("KJV", 19, 23)))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_ttl(self):
+        """Do entries expire?"""
+        self.cache.set(("KJV", 43, 3), JOHN_3)
+        self.now = 11
+
+        self.assertIsNone(self.cache.get(("KJV", 43, 3)))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+
+class ChapterCacheTestCase(TestCase):
+    """Test the shared disk layer."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_disk_shared_between_caches(self):
+        """Does a chapter cached by one worker reach another?"""
+        first = ChapterCache(LRUCache(), DiskCache(self.tmpdir.name))
+        second = ChapterCache(LRUCache(), DiskCache(self.tmpdir.name))
+
+        first.set(("KJV", 43, 3), JOHN_3)
+
+        self.assertEqual(second.get(("KJV", 43, 3)).to_list(), JOHN_3)
+        self.assertEqual(second.stats()["disk"]["hits"], 1)
+        # promoted to memory
+        second.get(("KJV", 43, 3))
+        self.assertEqual(second.stats()["memory"]["hits"], 1)
+
+    def test_disk_ttl_and_stale(self):
+        """Are expired files only served when stale results are allowed?"""
+        disk = DiskCache(self.tmpdir.name, ttl=60)
+        disk.set(("KJV", 43, 3), JOHN_3)
+        old = time.time() - 120
+        os.utime(disk.path(("KJV", 43, 3)), (old, old))
+
+        self.assertIsNone(disk.get(("KJV", 43, 3)))
+        self.assertEqual(disk.get(("KJV", 43, 3), allow_stale=True), JOHN_3)
+
+    def test_disk_size_eviction(self):
+        """Are the oldest files removed once the size limit is reached?"""
+        disk = DiskCache(self.tmpdir.name, max_bytes=3000)
+
+        for chapter in range(1, 6):
+            disk.set(("KJV", 43, chapter), JOHN_3)
+            old = time.time() - 100 + chapter
+            os.utime(disk.path(("KJV", 43, chapter)), (old, old))
+
+        self.assertLessEqual(disk.stats()["bytes"], 3000)
+        self.assertGreater(disk.stats()["evictions"], 0)
+        self.assertIsNotNone(disk.get(("KJV", 43, 5)))
+        self.assertIsNone(disk.get(("KJV", 43, 1)))
+
+    def test_disk_size_on_overwrite(self):
+        """Does rewriting an entry leave the tracked size unchanged?"""
+        disk = DiskCache(self.tmpdir.name)
+        disk.set(("KJV", 43, 3), JOHN_3)
+        disk.set(("KJV", 43, 4), JOHN_3)
+        size = disk.stats()["bytes"]
+
+        for _ in range(3):
+            disk.set(("KJV", 43, 4), JOHN_3)
+
+        self.assertEqual(disk.stats()["bytes"], size)
+        self.assertEqual(size, disk._scan_size())
@@ -0,0 +1,45 @@
+"""Compact chapter tests for Scripture Sanctuary."""
+
+from unittest import TestCase
+
+from api_requests import select_verses
+from compact_chapter import CompactChapter
+
+PSALM_23 = [
+    {"pk": 100 + v, "verse": v, "text": f"verse {v} – ψαλμός"} for v in range(1, 7)
+]
+
+
+class CompactChapterTestCase(TestCase):
+    """Test the buffer backed chapter and its verse ranges."""
+
+    def setUp(self):
+        self.chapter = CompactChapter.from_verses(PSALM_23)
+
+    def test_round_trip(self):
+        """Do verses come back unchanged, including non-ASCII text?"""
+        self.assertEqual(len(self.chapter), 6)
+        self.assertEqual(self.chapter.to_list(), PSALM_23)
+        self.assertEqual(self.chapter[0].text, "verse 1 – ψαλμός")
+        self.assertEqual(self.chapter[-1]["verse"], 6)
+        self.assertIs(CompactChapter.from_verses(self.chapter), self.chapter)
+
+    def test_select(self):
+        """Are ranges views over the chapter, selected like the old lists?"""
+        verses = select_verses(self.chapter, 2, 4)
+
+        self.assertIs(verses.chapter, self.chapter)
+        self.assertEqual([v.verse for v in verses], [2, 3, 4])
+        self.assertEqual([v.verse for v in select_verses(self.chapter, 5, None)], [5])
+        self.assertEqual(len(select_verses(self.chapter, None, 3)), 3)
+        self.assertEqual(len(select_verses(self.chapter, None, None)), 6)
+        self.assertEqual([v.verse for v in verses[1:]], [3, 4])
+
+    def test_out_of_range(self):
+        """Do verses outside the chapter raise IndexError?"""
+        with self.assertRaises(IndexError):
+            select_verses(self.chapter, 5, 9)
+        with self.assertRaises(IndexError):
+            select_verses(self.chapter, 7, None)
+        with self.assertRaises(IndexError):
+            select_verses(self.chapter, 4, 2)
@@ -0,0 +1,98 @@
+"""Strong's concordance tests for Scripture Sanctuary."""
+
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from concordance import Concordance
+from scripture_store import ScriptureStore
+from strongs import normalize, parse_verse
+
+VERSES = [
+    (1, 1, 1, "In the beginning<H7225> God<S>430</S> created<S>1254</S>"),
+    (43, 3, 16, "For God<S>2316</S> so loved<S>25</S> the world<S>2889</S>"),
+    (62, 4, 8, "for God<S>2316</S> is love<S>26</S>."),
+    (62, 4, 16, "God<S>2316</S> is love<S>26</S>; and he that dwelleth in love<S>26</S>"),
+    (62, 4, 17, "Herein is our love made perfect"),
+]
+
+
+class ConcordanceTestCase(TestCase):
+    """Test Strong's parsing and the concordance index."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "store.sqlite3")
+        self.store = ScriptureStore(self.path)
+        self.store.ingest(
+            "KJV",
+            [
+                {"book": b, "chapter": c, "verse": v, "text": text}
+                for b, c, v, text in VERSES
+            ],
+        )
+        self.concordance = Concordance(self.store)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_verse(self):
+        """Are tags split into clean text and lexicon prefixed numbers?"""
+        self.assertEqual(
+            parse_verse("God<S>430</S> created<S>1254</S>", 1),
+            ("God created", ["H430", "H1254"]),
+        )
+        self.assertEqual(parse_verse("is love<S>26</S>", 62), ("is love", ["G26"]))
+        self.assertEqual(parse_verse("Jesus wept.", 43), ("Jesus wept.", []))
+        self.assertEqual(normalize("g0026"), "G26")
+        self.assertIsNone(normalize("love"))
+
+    def test_store_keeps_clean_text(self):
+        """Does the store serve chapters without tags?"""
+        chapter = self.store.get_chapter("KJV", 62, 4)
+
+        self.assertEqual(chapter[0]["text"], "for God is love.")
+        self.assertNotIn("<S>", chapter[1]["text"])
+
+    def test_lookup(self):
+        """Are verses listed once each, in reading order?"""
+        results = self.concordance.lookup("G26", "KJV")
+
+        self.assertEqual(results["total"], 2)
+        self.assertEqual(
+            [(r["book"], r["chapter"], r["verse"]) for r in results["results"]],
+            [(62, 4, 8), (62, 4, 16)],
+        )
+        self.assertEqual(self.concordance.lookup("h430", "KJV")["total"], 1)
+        self.assertEqual(self.concordance.lookup("G26", "KJV", limit=1)["total"], 2)
+        self.assertEqual(len(self.concordance.lookup("G26", "KJV", limit=1)["results"]), 1)
+        self.assertEqual(self.concordance.lookup("G26", "NIV")["total"], 0)
+        self.assertIsNone(self.concordance.lookup("love", "KJV"))
+
+    def test_migrates_old_store(self):
+        """Are verses stored before the strongs column was added reparsed?"""
+        path = os.path.join(self.tmpdir.name, "old.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            """
+            CREATE TABLE verses (
+                translation TEXT NOT NULL, book INTEGER NOT NULL,
+                chapter INTEGER NOT NULL, verse INTEGER NOT NULL, pk INTEGER,
+                text TEXT NOT NULL,
+                PRIMARY KEY (translation, book, chapter, verse)
+            ) WITHOUT ROWID;
+            CREATE TABLE translations (
+                short_name TEXT PRIMARY KEY, verse_count INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            INSERT INTO verses VALUES ('KJV', 62, 4, 8, 1, 'God<S>2316</S> is love<S>26</S>.');
+            INSERT INTO translations VALUES ('KJV', 1, 1.0);
+            """
+        )
+        conn.close()
+
+        store = ScriptureStore(path)
+
+        self.assertEqual(store.get_chapter("KJV", 62, 4)[0]["text"], "God is love.")
+        self.assertEqual(Concordance(store).lookup("G26", "KJV")["total"], 1)
@@ -1,6 +1,8 @@
 from unittest import TestCase
+from unittest.mock import patch
 from app import app, CURR_USER_KEY
 from models import db, Favorite, User, Tag
+from chapter_cache import chapter_cache
 from flask import g
 
 # Make Flask errors be real errors, not HTML pages with error info
@@ -63,10 +65,18 @@ class FavoriteViewTestCase(TestCase):
         self.tag2 = Tag(name="inspirational")
         db.session.add_all([self.tag1, self.tag2])
         db.session.commit()
+
+        # the favorite pages render without reaching bolls.life
+        chapter_cache.set(
+            ("NIV", 43, 3),
+            [{"pk": v, "verse": v, "text": f"John 3:{v}"} for v in range(1, 17)],
+            shared=False,
+        )
         
     def tearDown(self):
             res = super().tearDown()
             db.session.rollback()
+            chapter_cache.memory.delete(("NIV", 43, 3))
             return res
         
     def test_show_favorite(self):
@@ -80,6 +90,41 @@ class FavoriteViewTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn("John 3:16", str(resp.data))
 
+    def test_show_favorite_not_modified(self):
+        """Is a repeat view a 304 without a fetch, until the tags change?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            url = f"/favorites/{self.test_favorite.id}"
+            resp = c.get(url)
+            resp.get_data()
+            etag = resp.headers["ETag"]
+            last_modified = resp.headers["Last-Modified"]
+            self.assertEqual(resp.headers["Cache-Control"], "private, no-cache")
+            self.assertIn("Last-Modified", resp.headers)
+
+            with patch("app.get_scripture") as get_scripture:
+                resp = c.get(url, headers={"If-None-Match": etag})
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp.data, b"")
+
+                resp = c.get(url, headers={"If-Modified-Since": last_modified})
+                self.assertEqual(resp.status_code, 304)
+                get_scripture.assert_not_called()
+
+            c.post(f"{url}/edit", data={"tags": [self.tag1.name]})
+            resp = c.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("important", resp.get_data(as_text=True))
+
+            # another viewer sees a different page
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1.id
+            resp = c.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+            self.assertEqual(resp.status_code, 200)
+            resp.get_data()
+
     def test_delete_favorite_logged_out(self):
         """Test that logged-out users cannot delete a favorite."""
         with self.client as c:
@@ -0,0 +1,52 @@
+"""Fragment cache tests for Scripture Sanctuary."""
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from markupsafe import Markup
+
+from app import app
+from compact_chapter import CompactChapter
+from fragment_cache import FragmentCache, fragment
+
+PASSAGE = ["KJV", 19, 23, 1, 2]
+
+
+class FragmentCacheTestCase(TestCase):
+    """Test size bounded eviction and rendering once per passage."""
+
+    def test_evicts_by_size(self):
+        """Are the least recently used fragments dropped past max_bytes?"""
+        cache = FragmentCache(max_bytes=10)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        cache.get("a")
+        cache.set("c", "cccc")
+
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), "aaaa")
+        self.assertEqual(cache.stats()["bytes"], 8)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        cache.set("huge", "x" * 11)
+        self.assertEqual(cache.get("huge"), None)
+
+    def test_fragment_renders_once(self):
+        """Is a passage rendered on the first call and looked up after?"""
+        verses = CompactChapter.from_verses(
+            [
+                {"verse": 1, "text": "The LORD is my shepherd"},
+                {"verse": 2, "text": "He maketh me to lie down <i>in</i> green pastures"},
+            ]
+        )
+
+        with patch("fragment_cache.fragment_cache", FragmentCache()) as cache:
+            with app.app_context():
+                html = fragment("verses", PASSAGE, verses=verses)
+                again = fragment("verses", PASSAGE, verses=None)
+
+            self.assertIsInstance(html, Markup)
+            self.assertIn("<i>in</i> green pastures", html)
+            self.assertIs(again, html)
+            self.assertEqual(cache.stats()["misses"], 1)
+            self.assertEqual(cache.stats()["hits"], 1)
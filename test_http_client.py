@@ -0,0 +1,127 @@
+"""HTTP client tests for Scripture Sanctuary."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from unittest.mock import patch
+
+from requests.exceptions import ChunkedEncodingError
+
+from http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 for the first `failures` requests, then 200"""
+
+    failures = 0
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        status = 503 if type(self).calls <= type(self).failures else 200
+        body = json.dumps([{"pk": 1, "verse": 1, "text": "Jesus wept."}]).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CircuitBreakerTestCase(TestCase):
+    """Test breaker state transitions."""
+
+    def setUp(self):
+        self.now = 0
+        self.breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=30, clock=lambda: self.now
+        )
+
+    def test_opens_after_failures(self):
+        """Does the breaker fail fast after consecutive failures?"""
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_trial(self):
+        """Is one trial request let through after the reset timeout?"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now = 31
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+class HttpClientTestCase(TestCase):
+    """Test retries and the breaker against a local server."""
+
+    def setUp(self):
+        FlakyHandler.calls = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_then_succeeds(self):
+        """Are 503s retried on pooled connections?"""
+        FlakyHandler.failures = 2
+        client = HttpClient(self.base_url, retries=2, backoff=0)
+
+        self.assertEqual(client.get_json("/get-chapter/KJV/43/11")[0]["verse"], 1)
+        self.assertEqual(client.stats()["retries"], 2)
+        self.assertEqual(client.stats()["pools"][0]["connections_opened"], 1)
+
+    def test_breaker_fails_fast(self):
+        """Does the client stop calling upstream once the breaker opens?"""
+        FlakyHandler.failures = 100
+        client = HttpClient(
+            self.base_url,
+            retries=0,
+            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60),
+        )
+
+        with self.assertRaises(Exception):
+            client.get("/get-chapter/KJV/43/11")
+        with self.assertRaises(CircuitOpenError):
+            client.get("/get-chapter/KJV/43/11")
+
+        self.assertEqual(FlakyHandler.calls, 1)
+        self.assertEqual(client.stats()["breaker"]["state"], "open")
+
+    def test_half_open_trial_other_error(self):
+        """Does a trial failing with a non-retried error let later calls through?"""
+        FlakyHandler.failures = 0
+        now = [0]
+        client = HttpClient(
+            self.base_url,
+            retries=0,
+            breaker=CircuitBreaker(
+                failure_threshold=1, reset_timeout=30, clock=lambda: now[0]
+            ),
+        )
+        client.breaker.record_failure()
+        now[0] = 31
+
+        with patch.object(
+            client.session, "get", side_effect=ChunkedEncodingError("truncated")
+        ):
+            with self.assertRaises(ChunkedEncodingError):
+                client.get("/get-chapter/KJV/43/11")
+        self.assertEqual(client.stats()["breaker"]["state"], "open")
+
+        now[0] = 62
+        self.assertEqual(client.get_json("/get-chapter/KJV/43/11")[0]["verse"], 1)
+        self.assertEqual(client.stats()["breaker"]["state"], "closed")
@@ -0,0 +1,112 @@
+"""Request timing and metrics tests for Scripture Sanctuary."""
+
+import os
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import api_requests
+from app import app
+from chapter_cache import chapter_cache
+from instrumentation import Histogram, RequestTimings, instrumented, timed, _current
+from models import db
+
+app.config["TESTING"] = True
+app.config["DEBUG_TB_HOSTS"] = ["dont-show-debug-toolbar"]
+app.config["WTF_CSRF_ENABLED"] = False
+
+db.create_all()
+
+
+@instrumented
+class SlowService:
+    def outer(self):
+        with timed("upstream"):
+            pass
+        return self.inner()
+
+    def inner(self):
+        return "done"
+
+
+class InstrumentationTestCase(TestCase):
+    """Test the Server-Timing header, service timing and /metrics."""
+
+    def test_server_timing_header(self):
+        """Does a page report its database and template time?"""
+        resp = app.test_client().get("/users")
+        header = resp.headers["Server-Timing"]
+
+        self.assertIn("db;dur=", header)
+        self.assertIn("template;dur=", header)
+        self.assertIn("total;dur=", header)
+
+    def test_service_counted_once(self):
+        """Is a service method calling another timed as one call?"""
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            self.assertEqual(SlowService().outer(), "done")
+        finally:
+            _current.reset(token)
+
+        self.assertEqual(timings.calls["service"], 1)
+        self.assertEqual(timings.calls["upstream"], 1)
+
+    def test_histogram_buckets(self):
+        """Are observations counted in every bucket they fit?"""
+        histogram = Histogram("test_seconds", "Test", ("route",), buckets=(0.1, 1))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{route="/a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="/a",le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count{route="/a"} 2', lines)
+
+    def test_metrics(self):
+        """Does /metrics list the requests served so far?"""
+        client = app.test_client()
+        # histograms are updated when the server closes the response
+        client.get("/users").close()
+        resp = client.get("/metrics")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith("text/plain; version=0.0.4"))
+        body = resp.get_data(as_text=True)
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="/users",status="200"}',
+            body,
+        )
+        self.assertIn('http_request_phase_seconds_count{route="/users",phase="db"}', body)
+
+    @patch("forms.translation_choices", return_value=[("NIV", "NIV")])
+    @patch("app.parse_references")
+    def test_reference_search_timing(self, parse_references, translation_choices):
+        """
+        Are chapters loaded on the fetch pool counted for the request that
+        asked for them?
+        """
+        parse_references.return_value = (
+            [["NIV", 43, 3, 1, None], ["NIV", 45, 8, 1, None]],
+            [],
+        )
+        chapter_cache.set(("NIV", 43, 3), [{"pk": 1, "verse": 1, "text": "..."}], shared=False)
+        upstream = Mock(status_code=200)
+        upstream.json.return_value = [{"pk": 2, "verse": 1, "text": "..."}]
+
+        try:
+            with patch.object(api_requests.client, "_get", return_value=upstream):
+                resp = app.test_client().get("/search/reference?q=x&translation=NIV")
+        finally:
+            for key in (("NIV", 43, 3), ("NIV", 45, 8)):
+                chapter_cache.memory.delete(key)
+                try:
+                    os.remove(chapter_cache.disk.path(key))
+                except OSError:
+                    pass
+
+        self.assertEqual(resp.status_code, 200)
+        header = resp.headers["Server-Timing"]
+        self.assertIn('chapter-cache;desc="hits=1 misses=1"', header)
+        self.assertIn("upstream;dur=", header)
@@ -0,0 +1,97 @@
+"""Password hashing tests for Scripture Sanctuary."""
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from app import app
+from models import db, User
+from password_hasher import PasswordHasher, PasswordHasherBusy, hash_rounds
+
+app.config["TESTING"] = True
+app.config["DEBUG_TB_HOSTS"] = ["dont-show-debug-toolbar"]
+app.config["WTF_CSRF_ENABLED"] = False
+
+db.create_all()
+
+
+class PasswordHasherTestCase(TestCase):
+    """Test the pool, the queue limit and rehashing on login."""
+
+    def test_pool_round_trip(self):
+        """Do hashes made in the pool verify, at the configured cost?"""
+        hasher = PasswordHasher(rounds=4, workers=1)
+        try:
+            hashed = hasher.hash("password")
+
+            self.assertEqual(hash_rounds(hashed), 4)
+            self.assertTrue(hasher.verify(hashed, "password"))
+            self.assertFalse(hasher.verify(hashed, "wrong"))
+            self.assertEqual(hasher.stats()["completed"], 3)
+        finally:
+            hasher.shutdown()
+
+    def test_pool_per_process(self):
+        """Does a forked worker start its own pool instead of the parent's?"""
+        hasher = PasswordHasher(rounds=4, workers=1)
+        try:
+            parent = hasher.pool()
+            self.assertIs(hasher.pool(), parent)
+
+            with patch("password_hasher.os.getpid", return_value=-1):
+                child = hasher.pool()
+                self.assertIsNot(child, parent)
+                self.assertTrue(hasher.verify(hasher.hash("password"), "password"))
+                hasher.shutdown()
+        finally:
+            parent.shutdown()
+            hasher.shutdown()
+
+    def test_rejects_when_full(self):
+        """Is a hash turned away at once when the queue is full?"""
+        hasher = PasswordHasher(rounds=4, workers=0, max_pending=1)
+        hasher._slots.acquire()
+
+        with self.assertRaises(PasswordHasherBusy):
+            hasher.hash("password")
+        self.assertEqual(hasher.stats()["rejected"], 1)
+
+        hasher._slots.release()
+        self.assertTrue(hasher.verify(hasher.hash("password"), "password"))
+
+    def test_rehash_on_login(self):
+        """Are hashes of another cost replaced when their owner logs in?"""
+        db.drop_all()
+        db.create_all()
+
+        with patch("models.password_hasher", PasswordHasher(rounds=4, workers=0)):
+            user = User.register("rehash", "password", "r@test.com", None, None, None, None)
+            db.session.add(user)
+            db.session.commit()
+
+        with patch("models.password_hasher", PasswordHasher(rounds=5, workers=0)):
+            self.assertFalse(User.authenticate("rehash", "wrong"))
+            self.assertEqual(hash_rounds(user.password), 4)
+
+            self.assertEqual(User.authenticate("rehash", "password"), user)
+            self.assertEqual(hash_rounds(user.password), 5)
+            self.assertTrue(User.authenticate("rehash", "password"))
+
+    def test_busy_login(self):
+        """Does a saturated hasher answer a login with a quick 503?"""
+        db.drop_all()
+        db.create_all()
+
+        with patch("models.password_hasher", PasswordHasher(rounds=4, workers=0)):
+            db.session.add(
+                User.register("someone", "password", "s@test.com", None, None, None, None)
+            )
+            db.session.commit()
+
+        busy = PasswordHasher(workers=0, max_pending=0)
+        with patch("models.password_hasher", busy):
+            resp = app.test_client().post(
+                "/login", data={"username": "someone", "password": "password"}
+            )
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers["Retry-After"], "2")
@@ -0,0 +1,190 @@
+"""Query budget tests for Scripture Sanctuary.
+
+Each route below may issue at most its budget of SQL statements, the same
+number with a handful of favorites and tags as with many, and no statement
+shape twice.
+"""
+
+from concurrent.futures import Future
+from unittest import TestCase
+from unittest.mock import patch
+
+from app import app, CURR_USER_KEY
+from identity_cache import identity_cache
+from models import db, User, Favorite, Tag
+from query_counter import QueryBudgetExceeded, QueryCounter, shape
+from services_tags import TagService
+
+app.config["TESTING"] = True
+app.config["DEBUG_TB_HOSTS"] = ["dont-show-debug-toolbar"]
+app.config["WTF_CSRF_ENABLED"] = False
+
+db.create_all()
+
+# statements per request, counting the signed in user's lookup
+ROUTE_BUDGETS = {
+    "/users": 2,
+    "/users/<user_id>": 3,
+    "/tags": 3,
+    "/tags/<tag_id>": 3,
+    "/favorites/<favorite_id>": 3,
+    "GET /favorites/<favorite_id>/edit": 4,
+    "POST /favorites/<favorite_id>/edit": 6,
+}
+
+
+def no_chapters(keys):
+    """submit_chapters without upstream: every chapter is missing"""
+    futures = {}
+    for key in keys:
+        futures[key] = Future()
+        futures[key].set_result(None)
+    return futures
+
+
+class QueryCounterTestCase(TestCase):
+    """Test statement shapes and budget checks."""
+
+    def test_shape(self):
+        """Do statements differing only in values share a shape?"""
+        self.assertEqual(
+            shape("SELECT * FROM tags WHERE id = 1 AND name = 'a''b'"),
+            shape("SELECT *\n  FROM tags WHERE id = 22 AND name = 'c'"),
+        )
+        self.assertEqual(
+            shape("SELECT * FROM tags WHERE id IN (?, ?, ?)"),
+            shape("SELECT * FROM tags WHERE id IN (?)"),
+        )
+        self.assertNotEqual(
+            shape("SELECT * FROM tags WHERE id = ?"),
+            shape("SELECT * FROM users WHERE id = ?"),
+        )
+
+    def test_detects_n_plus_one(self):
+        """Is a shape repeated past max_repeats reported?"""
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([Tag(name=f"tag{i}") for i in range(3)])
+        db.session.commit()
+
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with QueryCounter(db.engine, max_repeats=1):
+                for i in range(3):
+                    db.session.execute(db.text(f"SELECT * FROM tags WHERE id = {i}"))
+        self.assertIn("N+1: ran 3 times", str(raised.exception))
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with QueryCounter(db.engine, budget=1):
+                Tag.query.all()
+                User.query.all()
+
+
+class QueryBudgetTestCase(TestCase):
+    """Test that pages cost the same number of queries as data grows."""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+        identity_cache.entries.clear()
+
+        self.user = User(
+            id=1, username="reader", password="password", email="r@test.com"
+        )
+        self.tags = [Tag(name=f"tag{i}", user_id=1) for i in range(20)]
+        db.session.add(self.user)
+        db.session.add_all(self.tags)
+        db.session.commit()
+
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.user.id
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def add_favorites(self, count, tags):
+        favorites = []
+        for i in range(count):
+            favorite = Favorite(
+                user_id=self.user.id,
+                book=43,
+                chapter=i % 21 + 1,
+                start=1,
+                end=None,
+                translation="NIV",
+            )
+            favorite.tags = tags
+            favorites.append(favorite)
+        db.session.add_all(favorites)
+        db.session.commit()
+        return favorites
+
+    def requests(self, favorite, tags):
+        """(budget name, method, path, data) of every budgeted route"""
+        return [
+            ("/users", "GET", "/users", None),
+            ("/users/<user_id>", "GET", f"/users/{self.user.id}", None),
+            ("/tags", "GET", "/tags", None),
+            ("/tags/<tag_id>", "GET", f"/tags/{tags[0].id}", None),
+            ("/favorites/<favorite_id>", "GET", f"/favorites/{favorite.id}", None),
+            (
+                "GET /favorites/<favorite_id>/edit",
+                "GET",
+                f"/favorites/{favorite.id}/edit",
+                None,
+            ),
+            (
+                "POST /favorites/<favorite_id>/edit",
+                "POST",
+                f"/favorites/{favorite.id}/edit",
+                {"tags": [tag.name for tag in tags]},
+            ),
+        ]
+
+    def measure(self, favorite, tags):
+        """{budget name: statements issued}, checking each against its budget"""
+        counts = {}
+
+        for name, method, path, data in self.requests(favorite, tags):
+            # nothing already loaded hides a lazy load, each request pays
+            # for its signed in user
+            db.session.expunge_all()
+            identity_cache.entries.clear()
+
+            budget = ROUTE_BUDGETS[name]
+            with QueryCounter(db.engine, budget=budget, max_repeats=1) as queries:
+                resp = self.client.open(path, method=method, data=data)
+                resp.get_data()
+
+            self.assertLess(resp.status_code, 400, name)
+            counts[name] = queries.count
+
+        return counts
+
+    @patch("app.get_scripture", return_value=None)
+    @patch("app.submit_chapters", side_effect=no_chapters)
+    def test_routes_within_budget(self, submit_chapters, get_scripture):
+        """Do the main pages stay within budget as favorites and tags grow?"""
+        favorite = self.add_favorites(3, self.tags[:2])[0]
+        small = self.measure(favorite, self.tags[:2])
+
+        favorite = self.add_favorites(60, self.tags)[0]
+        large = self.measure(favorite, self.tags)
+
+        self.assertEqual(small, large)
+
+    def test_save_favorite_tags(self):
+        """Are a favorite's tags saved with the same queries for 2 or 20 tags?"""
+        counts = []
+
+        for tags in (self.tags[:2], self.tags):
+            names = [tag.name for tag in tags]
+            favorite = self.add_favorites(1, [])[0]
+
+            with QueryCounter(db.engine, max_repeats=1) as queries:
+                TagService().save_favorite_tags(favorite, names)
+            counts.append(queries.count)
+
+            self.assertEqual(len(Favorite.query.get(favorite.id).tags), len(tags))
+
+        self.assertEqual(counts[0], counts[1])
@@ -0,0 +1,93 @@
+"""Reference parser tests for Scripture Sanctuary."""
+
+import os
+import tempfile
+from unittest import TestCase
+
+from bible_metadata import SEED_PATH, MetadataRegistry
+from reference_parser import ReferenceParser
+
+
+def failing_fetch():
+    raise ConnectionError("bolls.life is down")
+
+
+class ReferenceParserTestCase(TestCase):
+    """Test parsing references against the seed book catalog."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        registry = MetadataRegistry(
+            os.path.join(self.tmpdir.name, "snapshot.json"),
+            SEED_PATH,
+            failing_fetch,
+            failing_fetch,
+        )
+        self.parser = ReferenceParser(registry)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_list(self):
+        """Do names, abbreviations and numbered books resolve to criteria?"""
+        criteria, unmatched = self.parser.parse("Jn 3:16-18; Rom 8; 1 Cor 13:4-7")
+
+        self.assertEqual(
+            criteria,
+            [
+                ["KJV", 43, 3, 16, 18],
+                ["KJV", 45, 8, None, None],
+                ["KJV", 46, 13, 4, 7],
+            ],
+        )
+        self.assertEqual(unmatched, [])
+
+    def test_name_forms(self):
+        """Are full names, prefixes, dots and roman numerals accepted?"""
+        for text, book in [
+            ("Song of Solomon 2:1", 22),
+            ("Judg. 5:1", 7),
+            ("Jude 1:3", 65),
+            ("II Kings 2:11", 12),
+            ("Philippians 4:13", 50),
+            ("phil 4:13", 50),
+            ("Phlm 1:4", 57),
+        ]:
+            criteria, _ = self.parser.parse(text, "NIV")
+            self.assertEqual(criteria[0][:2], ["NIV", book], text)
+
+    def test_continuations(self):
+        """Do bare numbers continue the previous book and chapter?"""
+        criteria, _ = self.parser.parse("Jn 3:16, 18; 4:1; Rom 8-9; Jude 3-5")
+
+        self.assertEqual(
+            criteria,
+            [
+                ["KJV", 43, 3, 16, None],
+                ["KJV", 43, 3, 18, None],
+                ["KJV", 43, 4, 1, None],
+                ["KJV", 45, 8, None, None],
+                ["KJV", 45, 9, None, None],
+                ["KJV", 65, 1, 3, 5],
+            ],
+        )
+
+    def test_unmatched(self):
+        """Are unknown books, bad chapters and notes reported?"""
+        criteria, unmatched = self.parser.parse("see also; Ps 151; Jn 3:16-4:2; Ps 23")
+
+        self.assertEqual(criteria, [["KJV", 19, 23, None, None]])
+        self.assertEqual(unmatched, ["see also", "Ps 151", "Jn 3:16-4:2"])
+
+    def test_parse_many(self):
+        """Does a batch parse each text on its own?"""
+        results = self.parser.parse_many(["Gen 1:1", "Rev 22:21", "nothing"])
+
+        self.assertEqual(
+            results,
+            [
+                ([["KJV", 1, 1, 1, None]], []),
+                ([["KJV", 66, 22, 21, None]], []),
+                ([], ["nothing"]),
+            ],
+        )
@@ -0,0 +1,59 @@
+"""Scripture store tests for Scripture Sanctuary."""
+
+import os
+import tempfile
+from unittest import TestCase
+
+from api_requests import select_verses
+from scripture_store import ScriptureStore
+
+
+class ScriptureStoreTestCase(TestCase):
+    """Test the local verse store."""
+
+    def setUp(self):
+        """Create a store in a temporary directory."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ScriptureStore(os.path.join(self.tmpdir.name, "store.sqlite3"))
+
+        self.store.ingest(
+            "KJV",
+            [
+                {"book": 43, "chapter": 3, "verse": v, "text": f"verse {v}", "pk": v}
+                for v in range(1, 37)
+            ],
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_chapter(self):
+        """Does an ingested chapter come back in verse order?"""
+        chapter = self.store.get_chapter("KJV", 43, 3)
+
+        self.assertEqual(len(chapter), 36)
+        self.assertEqual(chapter[15], {"pk": 16, "verse": 16, "text": "verse 16"})
+
+    def test_missing_translation(self):
+        """Are translations that weren't ingested left to the API?"""
+        self.assertTrue(self.store.has_translation("KJV"))
+        self.assertIsNone(self.store.get_chapter("NIV", 43, 3))
+        self.assertIsNone(self.store.get_chapter("KJV", 43, 99))
+
+    def test_reingest_replaces(self):
+        """Does ingesting again replace the old verses?"""
+        count = self.store.ingest(
+            "KJV", [{"book": 1, "chapter": 1, "verse": 1, "text": "In the beginning"}]
+        )
+
+        self.assertEqual(count, 1)
+        self.assertIsNone(self.store.get_chapter("KJV", 43, 3))
+
+    def test_select_verses(self):
+        """Are verse ranges sliced from a stored chapter?"""
+        chapter = self.store.get_chapter("KJV", 43, 3)
+
+        self.assertEqual([v["verse"] for v in select_verses(chapter, 16, 18)], [16, 17, 18])
+        self.assertEqual([v["verse"] for v in select_verses(chapter, 16, None)], [16])
+        self.assertEqual(len(select_verses(chapter, None, 3)), 3)
+        self.assertEqual(len(select_verses(chapter, None, None)), 36)
@@ -0,0 +1,87 @@
+"""Full-text search tests for Scripture Sanctuary."""
+
+import os
+import tempfile
+from unittest import TestCase
+
+from scripture_store import ScriptureStore
+from search_index import SearchEngine, parse_query
+
+VERSES = [
+    (1, 1, 1, "In the beginning God created the heaven and the earth."),
+    (19, 23, 1, "The LORD is my shepherd; I shall not want."),
+    (43, 3, 16, "For God so loved the world, that he gave his only begotten Son"),
+    (46, 13, 4, "Charity suffereth long, and is kind; charity envieth not"),
+    (62, 4, 8, "He that loveth not knoweth not God; for God is love."),
+    (62, 4, 16, "God is love; and he that dwelleth in love dwelleth in God<S>2316</S>"),
+]
+
+
+class SearchEngineTestCase(TestCase):
+    """Test the inverted index over the scripture store."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ScriptureStore(os.path.join(self.tmpdir.name, "store.sqlite3"))
+        self.store.ingest(
+            "KJV",
+            [
+                {"book": b, "chapter": c, "verse": v, "text": text}
+                for b, c, v, text in VERSES
+            ],
+        )
+        self.engine = SearchEngine(self.store)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def references(self, results):
+        return [(r["book"], r["chapter"], r["verse"]) for r in results["results"]]
+
+    def test_parse_query(self):
+        """Are phrases, OR and negation parsed?"""
+        self.assertEqual(
+            parse_query('love "is kind" -envy OR charity'),
+            [
+                [(False, ["love"]), (False, ["is", "kind"]), (True, ["envy"])],
+                [(False, ["charity"])],
+            ],
+        )
+
+    def test_phrase(self):
+        """Does a phrase only match words in sequence?"""
+        results = self.engine.search('"god is love"', "KJV")
+
+        self.assertEqual(self.references(results), [(62, 4, 16), (62, 4, 8)])
+        self.assertNotIn("<S>", results["results"][0]["text"])
+
+    def test_boolean_and_ranking(self):
+        """Are AND, OR and NOT applied and the best match ranked first?"""
+        self.assertEqual(
+            self.references(self.engine.search("god love NOT loveth", "KJV")),
+            [(62, 4, 16)],
+        )
+        results = self.engine.search("shepherd OR charity", "KJV")
+        self.assertEqual(results["total"], 2)
+        # charity appears twice in its verse
+        self.assertEqual(self.references(results)[0], (46, 13, 4))
+
+    def test_filters_and_pages(self):
+        """Are book filters and pages applied?"""
+        self.assertEqual(
+            self.references(self.engine.search("god", "KJV", book=43)), [(43, 3, 16)]
+        )
+
+        page = self.engine.search("god", "KJV", per_page=2, page=2)
+        self.assertEqual(page["total"], 4)
+        self.assertEqual(page["pages"], 2)
+        self.assertEqual(len(page["results"]), 2)
+        self.assertEqual(self.engine.search("god", "NIV")["total"], 0)
+
+    def test_rebuilds_on_ingest(self):
+        """Is only the re-ingested translation rebuilt?"""
+        kjv = self.engine.index("KJV")
+        self.store.ingest("ASV", [{"book": 43, "chapter": 11, "verse": 35, "text": "Jesus wept."}])
+
+        self.assertEqual(self.engine.search("wept", "ASV")["total"], 1)
+        self.assertIs(self.engine.index("KJV"), kjv)
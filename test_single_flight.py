@@ -0,0 +1,86 @@
+"""Single-flight tests for Scripture Sanctuary."""
+
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from single_flight import SingleFlight
+
+
+class SingleFlightTestCase(TestCase):
+    """Test request coalescing."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.flight = SingleFlight(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_concurrent_calls_share_one_fetch(self):
+        """Do concurrent callers for one chapter wait on a single fetch?"""
+        fetches = []
+        results = []
+
+        def fetch():
+            fetches.append(1)
+            time.sleep(0.2)
+            return ["John 3"]
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.flight.do(("NIV", 43, 3), fetch))
+            )
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(results, [["John 3"]] * 10)
+        self.assertEqual(self.flight.stats()["coalesced"], 9)
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+    def test_errors_reach_every_waiter(self):
+        """Does a failed fetch raise in the leader and the waiters?"""
+
+        def fetch():
+            time.sleep(0.1)
+            raise ValueError("upstream down")
+
+        errors = []
+
+        def call():
+            try:
+                self.flight.do(("NIV", 43, 3), fetch)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 3)
+
+    def test_process_lock_reports_wait(self):
+        """Is a second holder of the chapter lock told it waited?"""
+        waited = []
+
+        def second_worker():
+            with self.flight.process_lock(("NIV", 43, 3)) as second:
+                waited.append(second)
+
+        with self.flight.process_lock(("NIV", 43, 3)) as first:
+            other = threading.Thread(target=second_worker)
+            other.start()
+            time.sleep(0.1)
+
+        other.join()
+        self.assertFalse(first)
+        self.assertEqual(waited, [True])
+        self.assertEqual(self.flight.stats()["process_waits"], 1)
@@ -1,9 +1,11 @@
 import os
 from unittest import TestCase
+from unittest.mock import patch
 from flask import session
 from models import db, connect_db, Tag, User, Favorite
 from app import app, CURR_USER_KEY
 from sqlalchemy.exc import IntegrityError
+from chapter_cache import chapter_cache
 
 # Make Flask errors be real errors, not HTML pages with error info
 app.config['TESTING'] = True
@@ -62,6 +64,60 @@ class TagViewTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn("TestTag1", str(resp.data))
 
+    def test_show_tag_details_streams(self):
+        """Are tag entries streamed with flashes shown only once?"""
+        favorite = Favorite(
+            user_id=self.testuser.id, book=19, chapter=23, start=1, translation="KJV"
+        )
+        favorite.tags.append(self.tag1)
+        db.session.add(favorite)
+        db.session.commit()
+        chapter_cache.set(
+            ("KJV", 19, 23),
+            [{"verse": 1, "text": "The LORD is my shepherd"}],
+            shared=False,
+        )
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess["_flashes"] = [("success", "Saved!")]
+
+            resp = c.get(f"/tags/{self.tag1.id}")
+            self.assertTrue(resp.is_streamed)
+            html = resp.get_data(as_text=True)
+            self.assertIn("The LORD is my shepherd", html)
+            self.assertIn("Saved!", html)
+
+            resp = c.get(f"/tags/{self.tag1.id}")
+            self.assertNotIn("Saved!", resp.get_data(as_text=True))
+
+        chapter_cache.memory.delete(("KJV", 19, 23))
+
+    def test_show_tag_details_not_modified(self):
+        """Is a repeat view a 304 without loading chapters, until favorites change?"""
+        with self.client as c:
+            url = f"/tags/{self.tag1.id}"
+            resp = c.get(url)
+            resp.get_data()
+            etag = resp.headers["ETag"]
+            self.assertEqual(resp.headers["Cache-Control"], "public, no-cache")
+
+            with patch("app.submit_chapters") as submit_chapters:
+                resp = c.get(url, headers={"If-None-Match": etag})
+                self.assertEqual(resp.status_code, 304)
+                submit_chapters.assert_not_called()
+
+            favorite = Favorite(
+                user_id=self.testuser.id, book=19, chapter=23, translation="KJV"
+            )
+            favorite.tags.append(self.tag1)
+            db.session.add(favorite)
+            db.session.commit()
+
+            resp = c.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(resp.status_code, 200)
+            resp.get_data()
+
     def test_create_tag(self):
         """Test tag creation functionality."""
         with self.client as c:
@@ -0,0 +1,178 @@
+"""Favorites import/export tests for Scripture Sanctuary."""
+
+import io
+import json
+from unittest import TestCase
+
+from app import app, CURR_USER_KEY
+from models import db, Favorite, FavoriteTag, User, Tag
+from services_transfer import iter_json
+
+app.config["TESTING"] = True
+app.config["DEBUG_TB_HOSTS"] = ["dont-show-debug-toolbar"]
+app.config["WTF_CSRF_ENABLED"] = False
+
+db.create_all()
+
+CSV_FILE = """reference,translation,tags
+Jn 3:16-18,NIV,love|hope
+Rom 8,,hope
+Ps 151,KJV,
+"""
+
+CSV_VERSES = """book,chapter,start,end
+43,3,18,16
+43,0,1,
+43,3,0,
+43,3,-2,
+43,3,16,18
+"""
+
+
+class TransferViewTestCase(TestCase):
+    """Test bulk import and streaming export of favorites."""
+
+    def setUp(self):
+        db.drop_all()
+        db.create_all()
+
+        self.client = app.test_client()
+
+        self.testuser = User.register(
+            username="testuser",
+            pwd="password",
+            email="test@test.com",
+            first_name="Test",
+            last_name="User",
+            img_url=None,
+            profile_img_url=None,
+        )
+        self.testuser.id = 1234
+        self.u1 = User.register(
+            username="abc",
+            pwd="password",
+            email="test1@test.com",
+            first_name="First",
+            last_name="User",
+            img_url=None,
+            profile_img_url=None,
+        )
+        self.u1.id = 111
+        db.session.add_all([self.testuser, self.u1, Tag(name="hope")])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def upload(self, c, user_id, filename, body):
+        return c.post(
+            f"/users/{user_id}/favorites/import",
+            data={"file": (io.BytesIO(body.encode()), filename), "translation": "KJV"},
+            content_type="multipart/form-data",
+            follow_redirects=True,
+        )
+
+    def test_import_csv(self):
+        """Are references parsed, tags reused or created and bad rows skipped?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = self.upload(c, self.testuser.id, "notes.csv", CSV_FILE)
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Imported 2 favorites and created 1 topics", html)
+            self.assertIn("Row 3", html)
+
+        favorites = Favorite.query.order_by(Favorite.id).all()
+        self.assertEqual(
+            [(f.translation, f.book, f.chapter, f.start, f.end) for f in favorites],
+            [("NIV", 43, 3, 16, 18), ("KJV", 45, 8, None, None)],
+        )
+        self.assertEqual(sorted(t.name for t in favorites[0].tags), ["hope", "love"])
+        self.assertEqual(Tag.query.filter_by(name="love").one().user_id, self.testuser.id)
+
+    def test_import_invalid_verses(self):
+        """Are rows with verses that can never render skipped?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = self.upload(c, self.testuser.id, "notes.csv", CSV_VERSES)
+            html = resp.get_data(as_text=True)
+
+            self.assertIn("Imported 1 favorites", html)
+            self.assertIn("Skipped 4 rows", html)
+            self.assertIn("start verse 18 is after end verse 16", html)
+
+        favorites = Favorite.query.all()
+        self.assertEqual(
+            [(f.chapter, f.start, f.end) for f in favorites], [(3, 16, 18)]
+        )
+
+    def test_import_unreadable_csv(self):
+        """Is a CSV the reader can't parse reported rather than an error?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            # longer than the csv module's field limit
+            body = "reference\nJn 3:16\n" + "x" * 200_000 + "\n"
+            resp = self.upload(c, self.testuser.id, "notes.csv", body)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Could not read the file", resp.get_data(as_text=True))
+
+        self.assertEqual(Favorite.query.count(), 0)
+
+    def test_export_round_trip(self):
+        """Does an export import cleanly into another account?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+            self.upload(c, self.testuser.id, "notes.csv", CSV_FILE)
+
+            resp = c.get(f"/users/{self.testuser.id}/favorites/export.csv")
+            self.assertEqual(resp.mimetype, "text/csv")
+            self.assertIn("John 3:16-18,NIV,43,3,16,18", resp.get_data(as_text=True))
+
+            json_export = c.get(
+                f"/users/{self.testuser.id}/favorites/export.json"
+            ).get_data(as_text=True)
+            records = json.loads(json_export)
+            self.assertEqual(len(records), 2)
+            self.assertEqual(records[0]["tags"], ["hope", "love"])
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1.id
+            resp = self.upload(c, self.u1.id, "favorites.json", json_export)
+            self.assertIn("Imported 2 favorites and created 0 topics", resp.get_data(as_text=True))
+
+        self.assertEqual(Favorite.query.filter_by(user_id=self.u1.id).count(), 2)
+        self.assertEqual(FavoriteTag.query.count(), 6)
+
+    def test_unauthorized(self):
+        """Can only the owner export or import?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.u1.id
+
+            resp = c.get(f"/users/{self.testuser.id}/favorites/export.csv")
+            self.assertEqual(resp.status_code, 302)
+
+            self.upload(c, self.testuser.id, "notes.csv", CSV_FILE)
+            self.assertEqual(Favorite.query.count(), 0)
+
+    def test_iter_json_chunks(self):
+        """Are objects split across read chunks decoded, for lists and lines?"""
+        records = [{"reference": f"Ps {n}", "tags": ["psalm"]} for n in range(1, 40)]
+
+        as_list = io.BytesIO(json.dumps(records).encode())
+        as_lines = io.BytesIO("\n".join(json.dumps(r) for r in records).encode())
+
+        self.assertEqual(list(iter_json(as_list, chunk_size=7)), records)
+        self.assertEqual(list(iter_json(as_lines, chunk_size=7)), records)
+
+        with self.assertRaises(ValueError):
+            list(iter_json(io.BytesIO(b'[{"reference": "Ps 1"}, oops]')))
@@ -1,8 +1,12 @@
 """View tests for User routes in Scripture Sanctuary."""
 
+import base64
+import json
 from unittest import TestCase
-from models import db, User
+from models import db, User, Favorite, Tag
 from app import app, CURR_USER_KEY
+from query_counter import QueryCounter
+from identity_cache import identity_cache
 
 # Import the app after setting the database URL
 from app import app
@@ -27,6 +31,7 @@ class UserViewTestCase(TestCase):
         """Create test client and add sample data."""
         db.drop_all()
         db.create_all()
+        identity_cache.entries.clear()
 
         self.client = app.test_client()
 
@@ -75,6 +80,49 @@ class UserViewTestCase(TestCase):
             self.assertIn("testuser", str(resp.data))
             self.assertIn("otheruser", str(resp.data))
 
+    def test_show_users_pagination(self):
+        """Are users listed a page at a time?"""
+        db.session.add_all(
+            [
+                User(username=f"reader{i:02}", password="x", email=f"r{i}@test.com")
+                for i in range(60)
+            ]
+        )
+        db.session.commit()
+
+        with self.client as c:
+            resp = c.get("/users")
+            html = resp.get_data(as_text=True)
+            self.assertIn("@testuser", html)
+            self.assertNotIn("@reader59", html)
+            self.assertIn("More users", html)
+
+            next_url = html.split('href="/users?after=')[1].split('"')[0]
+            resp = c.get(f"/users?after={next_url}")
+            html = resp.get_data(as_text=True)
+            self.assertIn("@reader59", html)
+            self.assertNotIn("@testuser", html)
+            self.assertNotIn("More users", html)
+
+    def test_mistyped_cursor(self):
+        """Does a cursor with values of the wrong type fall back to page one?"""
+        self.add_favorites(1, [])
+
+        def cursor(values):
+            return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+        with self.client as c:
+            for values in (["abc"], [True], [1.5]):
+                resp = c.get("/users", query_string={"after": cursor(values)})
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn("@testuser", resp.get_data(as_text=True))
+
+            resp = c.get(
+                f"/users/{self.testuser.id}", query_string={"after": cursor([5, 6])}
+            )
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn("No favorites yet.", resp.get_data(as_text=True))
+
     def test_user_profile(self):
         """Test if user profile page shows correct information."""
         with self.client as c:
@@ -83,6 +131,42 @@ class UserViewTestCase(TestCase):
             self.assertIn("Test User", str(resp.data))
             self.assertIn("@testuser", str(resp.data))
 
+    def add_favorites(self, count, tags):
+        """Adds favorites for testuser, each tagged with every tag"""
+        for i in range(count):
+            favorite = Favorite(
+                user_id=self.testuser.id,
+                book=43,
+                chapter=3,
+                start=i + 1,
+                end=None,
+                translation="NIV",
+            )
+            favorite.tags = tags
+            db.session.add(favorite)
+        db.session.commit()
+
+    def test_user_profile_query_count(self):
+        """Does the profile page issue the same number of queries as it grows?"""
+        tags = [Tag(name=f"tag{i}", user_id=self.other_user.id) for i in range(5)]
+        db.session.add_all(tags)
+        self.add_favorites(5, tags[:2])
+
+        with self.client as c:
+            with QueryCounter(db.engine) as small:
+                resp = c.get(f"/users/{self.testuser.id}")
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("tag1", str(resp.data))
+
+            self.add_favorites(50, tags)
+
+            with QueryCounter(db.engine) as large:
+                resp = c.get(f"/users/{self.testuser.id}")
+            self.assertIn("tag4", str(resp.data))
+
+        self.assertEqual(small.count, large.count)
+        self.assertLessEqual(large.count, 4)
+
     def test_edit_user(self):
         """Test if user can edit their profile."""
         with self.client as c:
@@ -107,6 +191,55 @@ class UserViewTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn("updateduser", str(resp.data))
 
+    def test_identity_cached(self):
+        """Is the signed in user read from the cache until they change?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.get("/")
+            with QueryCounter(db.engine) as queries:
+                resp = c.get("/")
+            self.assertEqual(resp.status_code, 302)
+            self.assertEqual(queries.count, 0)
+
+            c.post(
+                f"/users/{self.testuser.id}/edit",
+                data={
+                    "username": "updateduser",
+                    "password": "",
+                    "first_name": "Updated",
+                    "last_name": "User",
+                    "email": "updated@test.com",
+                    "profile_img_url": "http://example.com/profile.jpg",
+                },
+            )
+            resp = c.get("/tags")
+            self.assertIn("http://example.com/profile.jpg", str(resp.data))
+
+            c.get("/logout")
+            self.assertIsNone(identity_cache.entries.get(self.testuser.id))
+
+    def test_identity_deleted_elsewhere(self):
+        """Is a cached user whose row is gone signed out instead of erroring?"""
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            c.get("/")
+            self.assertIsNotNone(identity_cache.entries.get(self.testuser.id))
+
+            # another worker deletes the user, this one's cache entry stays
+            db.session.execute(db.delete(User).where(User.id == self.testuser.id))
+            db.session.commit()
+
+            resp = c.get(f"/users/{self.testuser.id}/edit")
+            self.assertEqual(resp.status_code, 302)
+            self.assertIsNone(identity_cache.entries.get(self.testuser.id))
+
+            with c.session_transaction() as sess:
+                self.assertNotIn(CURR_USER_KEY, sess)
+
     def test_edit_user_logged_out(self):
         """Test if logged out users are prohibited from editing user profiles."""
         with self.client as c: